@@ -3,94 +3,68 @@ import time
 import pandas as pd
 import random
 import os
-import base64
-from PIL import Image, ImageOps, ImageEnhance
-from streamlit_gsheets import GSheetsConnection
 from streamlit_image_coordinates import streamlit_image_coordinates
+from streamlit_js_eval import streamlit_js_eval
 import re
-import gspread
-from google.oauth2.service_account import Credentials
-
-# --- CONFIGURATION ---
+import urllib.parse
+import json
+from encoders import negotiate_format, probe_images
+from glitch_board import glitch_board, layout_token
+from layout import LEVEL_FILES, get_num_real_targets, make_layout
+from layout_pool import get_layout_pool
+from prefetch import LayoutPrefetcher, wait_for_render
+from render_cache import get_render_cache
+from renderer import render_layout
+from static_assets import publish_asset
+from audio_manager import audio_manager, play_sfx
+from score_store import open_score_store
+import metrics
+from warmup import get_warm_up
+from config import (
+    ANIMATION_FORMAT, ANIMATION_MAX_BYTES, ANIMATION_QUALITY, AUDIO_VOLUME, BACKGROUND_VIDEO, BOARD_RENDERER,
+    GAME_WIDTH, GLITCHES_PER_LEVEL, HIT_TOLERANCE, LAYOUT_POOL_DIR, LEADERBOARD_SIZE,
+    MAX_PIXEL_RATIO, MUSIC_TRACKS, PREFETCH_DEPTH, RENDER_CACHE_BYTES, RENDER_CACHE_DIR, RENDER_TIERS,
+    SOUND_EFFECTS,
+)
+
+# --- CONFIGURATION --- (settings live in config.py)
 st.set_page_config(page_title="DETROIT: ANOMALY [09]", layout="wide", initial_sidebar_state="collapsed")
 
-GAME_WIDTH = 1200
-HIT_TOLERANCE = 150
-
-LEVEL_FILES = ["assets/level1.png", "assets/level2.png", "assets/level3.png"]
-GLITCHES_PER_LEVEL = [3, 5, 7]
-
 # --- HELPER: ASSETS ---
-def get_base64(bin_file):
-    try:
-        with open(bin_file, 'rb') as f: return base64.b64encode(f.read()).decode()
-    except: return None
-
-# --- AUDIO FUNCTIONS ---
-@st.cache_data(show_spinner=False, persist="disk")
-def get_audio_base64(bin_file):
-    try:
-        with open(bin_file, 'rb') as f: return base64.b64encode(f.read()).decode()
-    except: return None
-
-# --- NEW: Background Music Function ---
-def play_background_music(audio_file, file_type="mp3", audio_id="bg-music"):
-    """
-    Plays a looping background music track.
-    """
-    try:
-        audio_base64 = get_audio_base64(audio_file)
-        if audio_base64:
-            audio_html = f"""
-                <audio id="{audio_id}" autoplay loop style="display:none;">
-                    <source src="data:audio/{file_type};base64,{audio_base64}" type="audio/{file_type}">
-                </audio>
-            """
-            return audio_html
-        return ""
-    except Exception as e:
-        print(f"Background audio error: {e}")
-        return ""
-
-# --- NEW: Sound Effect Function ---
-def play_audio(audio_file, file_type="wav", audio_id=""):
-    """
-    Plays a one-shot sound effect.
-    Uses a unique ID to be re-triggerable.
-    """
-    try:
-        audio_base64 = get_audio_base64(audio_file)
-        if audio_base64:
-            # Use a unique key to force re-rendering and re-playing
-            unique_id = f"{audio_id}_{random.randint(1000,9999)}"
-            audio_html = f"""
-                <audio id="{unique_id}" autoplay style="display:none;">
-                    <source src="data:audio/{file_type};base64,{audio_base64}" type="audio/{file_type}">
-                </audio>
-            """
-            st.markdown(audio_html, unsafe_allow_html=True)
+@metrics.timed("asset_url")
+def asset_url(path):
+    """Browser URL for a local media file (published to ./static) or a remote one; None if missing."""
+    if path.startswith(("http://", "https://")): return path
+    try: return publish_asset(path)
     except Exception as e:
-        print(f"Audio error: {e}")
-        pass
+        print(f"Asset publish error: {e}")
+        return None
 
 # --- CSS: ULTRA GLITCH + MOBILE FIX ---
+NOISE_SVG = "data:image/svg+xml," + urllib.parse.quote(
+    "<svg xmlns='http://www.w3.org/2000/svg' width='256' height='256'>"
+    "<filter id='n'><feTurbulence type='fractalNoise' baseFrequency='0.85' numOctaves='2' stitchTiles='stitch'/>"
+    "<feColorMatrix type='saturate' values='0'/></filter><rect width='100%' height='100%' filter='url(#n)'/></svg>")
+
+@metrics.timed("inject_css")
 def inject_css(video_file_path):
     
-    # 1. ENCODE THE VIDEO FILE
-    video_base64 = get_base64(video_file_path)
+    # 1. PUBLISH THE VIDEO FILE (served once, then cached by the browser)
+    video_src = asset_url(video_file_path)
     
     # 2. CREATE THE HTML <video> TAG
-    if video_base64:
+    video_html = ""
+    if video_src:
         video_html = f"""
-        <video id="video-bg" autoplay loop muted>
-            <source src="data:video/mp4;base64,{video_base64}" type="video/mp4">
+        <video id="video-bg" autoplay loop muted playsinline>
+            <source src="{video_src}" type="video/mp4">
             Your browser does not support the video tag.
         </video>
         """
         st.markdown(video_html, unsafe_allow_html=True)
 
     # 3. CSS for the video + original CSS
-    st.markdown(f"""
+    css = f"""
         <style>
             /* --- START: VIDEO BACKGROUND --- */
             #video-bg {{
@@ -125,6 +99,11 @@ def inject_css(video_file_path):
                 overflow-x: auto !important;
             }}
             
+            /* AUDIO MANAGER: invisible, but kept rendered so playback continues */
+            div[data-testid="stElementContainer"]:has(iframe[title="audio_manager.audio_manager"]) {{
+                position: absolute; width: 0; height: 0; overflow: hidden; margin: 0;
+            }}
+
             /* HARDWARE-ACCELERATED STATIC OVERLAY */
             #static-overlay {{
                 position: fixed; top: -50%; left: -50%; width: 200%; height: 200%;
@@ -154,6 +133,27 @@ def inject_css(video_file_path):
             img, #static-overlay {{ animation: none !important; }}
             #static-overlay {{ animation: gpu-jitter 0.3s infinite linear alternate-reverse !important; }}
 
+            /* STATIC TRANSITION: 0.1s blackout, then 0.4s of TV noise (rendered from an inline SVG) */
+            div[data-testid="stElementContainer"]:has(.effects-slot) {{
+                position: absolute; width: 0; height: 0; margin: 0;
+            }}
+            .static-transition {{
+                position: fixed; inset: 0; z-index: 10000; pointer-events: none; overflow: hidden;
+                background-color: #111; animation: static-transition 0.5s step-end forwards !important;
+            }}
+            .static-transition::after {{
+                content: ""; position: absolute; inset: -50%; background: url("{NOISE_SVG}") repeat;
+                mix-blend-mode: hard-light; opacity: 0;
+                animation: static-show 0s 0.1s forwards, static-jitter 0.12s steps(3) infinite;
+            }}
+            @keyframes static-transition {{ to {{ visibility: hidden; }} }}
+            @keyframes static-show {{ to {{ opacity: 0.8; }} }}
+            @keyframes static-jitter {{
+                0% {{ transform: translate3d(0, 0, 0); }}
+                33% {{ transform: translate3d(-7%, 5%, 0); }}
+                66% {{ transform: translate3d(4%, -9%, 0); }}
+            }}
+
             @keyframes glitch-text {{
                 0% {{ text-shadow: 0.05em 0 0 rgba(255,0,0,0.75), -0.025em -0.05em 0 rgba(0,255,0,0.75), 0.025em 0.05em 0 rgba(0,0,255,0.75); }}
                 14% {{ text-shadow: 0.05em 0 0 rgba(255,0,0,0.75), -0.025em -0.05em 0 rgba(0,255,0,0.75), 0.025em 0.05em 0 rgba(0,0,255,0.75); }}
@@ -175,164 +175,129 @@ def inject_css(video_file_path):
                 }}
             }}
         </style>
-    """, unsafe_allow_html=True)
+    """
+    st.markdown(css, unsafe_allow_html=True)
+    metrics.payload("inject_css", len(video_html) + len(css))
 
+# --- TRANSITIONS & NOTICES ---
+# Effects are requested through session state and emitted at a fixed spot on
+# the next run; the browser then animates them on its own, so the script
+# never sleeps while they play.
 def trigger_static_transition():
-    play_audio("https://www.myinstants.com/media/sounds/static-noise.mp3", file_type="mp3", audio_id="static")
-    placeholder = st.empty()
-    with placeholder.container():
-        st.markdown('<div style="position:fixed;top:0;left:0;width:100%;height:100%;background-color:#111;z-index:10000;"></div>', unsafe_allow_html=True)
-        time.sleep(0.1)
-        g_url = "https://media.giphy.com/media/oEI9uBYSzLpBK/giphy.gif"
-        st.markdown(f'<div style="position:fixed;top:0;left:0;width:100%;height:100%;background:url({g_url});background-size:cover;z-index:10001;opacity:0.8;mix-blend-mode:hard-light;"></div>', unsafe_allow_html=True)
-        time.sleep(0.4)
-    placeholder.empty()
+    play_sfx("static")
+    st.session_state.transitions += 1
+
+def notify(text, icon):
+    st.session_state.notices.append((text, icon))
+
+def render_effects():
+    pending = st.session_state.transitions > st.session_state.transitions_shown
+    st.session_state.transitions_shown = st.session_state.transitions
+    # A new data-n makes the browser build a fresh element, which restarts the CSS animation
+    effect = f'<div class="static-transition" data-n="{st.session_state.transitions}"></div>' if pending else ''
+    st.markdown(f'<div class="effects-slot">{effect}</div>', unsafe_allow_html=True)
+    for text, icon in st.session_state.notices: st.toast(text, icon=icon)
+    st.session_state.notices = []
+
+# --- RESOLUTION TIERS ---
+VIEWPORT_JS = "[Math.min(window.parent.innerWidth, screen.width), window.devicePixelRatio || 1].join(',')"
+
+def pick_render_tier(viewport_width, pixel_ratio):
+    """Smallest tier covering the viewport in device pixels, or the largest tier."""
+    wanted = viewport_width * min(pixel_ratio, MAX_PIXEL_RATIO)
+    return next((tier for tier in RENDER_TIERS if tier >= wanted), RENDER_TIERS[-1])
+
+def board_width():
+    return st.session_state.board_width or GAME_WIDTH
+
+def hit_tolerance(width):
+    return HIT_TOLERANCE * width / GAME_WIDTH
+
+# --- ANIMATION FORMAT NEGOTIATION ---
+def get_format_probe_js():
+    # Resolves to a comma-separated list of the animated formats the browser can decode
+    probes = json.dumps(probe_images())
+    return f"""Promise.all(Object.entries({probes}).map(([fmt, src]) => new Promise(done => {{
+        const img = new Image(); img.onload = () => done(fmt); img.onerror = () => done(""); img.src = src;
+    }}))).then(found => found.filter(Boolean).join(","))"""
+
+def get_animation_format():
+    return negotiate_format(ANIMATION_FORMAT, st.session_state.client_formats, ANIMATION_QUALITY, ANIMATION_MAX_BYTES)
 
 # --- SMART GLITCH GENERATION ---
-def get_random_box(level, is_fake=False):
-    if is_fake: max_s, min_s = max(180 - level*15, 60), max(70 - level*5, 40)
-    else: max_s, min_s = max(150 - level*20, 30), min(max(50 - level*10, 15), max(150 - level*20, 30))
-    w, h = random.randint(min_s, max_s), random.randint(min_s, max_s)
-    return (random.randint(50, 1024-w-50), random.randint(50, 1024-h-50), w, h)
-
-def check_overlap(box1, box2, buffer=20):
-    b1_x1, b1_y1, b1_x2, b1_y2 = box1[0], box1[1], box1[0]+box1[2], box1[1]+box1[3]
-    b2_x1, b2_y1, b2_x2, b2_y2 = box2[0], box2[1], box2[0]+box2[2], box2[1]+box2[3]
-    if (b1_x2 + buffer < b2_x1) or (b2_x2 + buffer < b1_x1) or (b1_y2 + buffer < b2_y1) or (b2_y2 + buffer < b1_y1): return False
-    return True
-
 def move_glitch(num_real=1):
     lvl = st.session_state.current_level
-    st.session_state.glitch_seed = random.randint(1, 100000)
-    real_temp, fake_temp = [], []
-    for _ in range(num_real):
-        while True:
-            nb = get_random_box(lvl, False)
-            if not any(check_overlap(nb, b) for b in real_temp): real_temp.append(nb); break
-    for _ in range(lvl + 1):
-        at = 0
-        while at < 50:
-            nb = get_random_box(lvl, True)
-            if not any(check_overlap(nb, b) for b in real_temp + fake_temp): fake_temp.append(nb); break
-            at += 1
-    st.session_state.real_boxes = [(x,y,x+w,y+h) for x,y,w,h in real_temp]
-    st.session_state.fake_boxes = [(x,y,x+w,y+h) for x,y,w,h in fake_temp]
+    width = board_width()
+    st.session_state.moves += 1
+    if BOARD_RENDERER == "client":
+        # Nothing to render server-side: the board draws the layout from its seed
+        seed = random.randint(1, 100000)
+        real_boxes, fake_boxes = make_layout(lvl, seed, num_real)
+        st.session_state.update({'glitch_seed': seed, 'real_boxes': real_boxes, 'fake_boxes': fake_boxes, 'glitch_render': None})
+        st.session_state.last_move_time = time.time()
+        return
+    prefetcher = st.session_state.prefetcher
+    out_format = get_animation_format()
+    # Prefer a pre-rendered layout from the offline pool, then a prefetched one
+    pooled = get_layout_pool(LAYOUT_POOL_DIR).choose(lvl, width, out_format, exclude=st.session_state.glitch_seed)
+    nxt = None if pooled else prefetcher.pop(lvl, out_format)
+    metrics.cache_lookup("layout_pool", pooled is not None)
+    if not pooled: metrics.cache_lookup("prefetch", nxt is not None)
+    if pooled:
+        seed, real_boxes, fake_boxes, render = pooled.seed, pooled.real_boxes, pooled.fake_boxes, None
+    elif nxt:
+        seed, real_boxes, fake_boxes, render = nxt.seed, nxt.real_boxes, nxt.fake_boxes, nxt.render
+    else:
+        seed, render = random.randint(1, 100000), None
+        real_boxes, fake_boxes = make_layout(lvl, seed, num_real)
+    st.session_state.update({'glitch_seed': seed, 'real_boxes': real_boxes, 'fake_boxes': fake_boxes, 'glitch_render': render})
     st.session_state.last_move_time = time.time()
+    if pooled: prefetcher.cancel()
+    else: prefetcher.fill(lvl, LEVEL_FILES[lvl], num_real, width, out_format)
 
-def generate_mutating_frame(base_img, boxes, is_fake=False):
-    frame = base_img.copy()
-    if not isinstance(boxes, list): boxes = [boxes]
-    contrast_level = 1.0 if is_fake else 3.0 
-    for box in boxes:
-        x1, y1, x2, y2 = box
-        cx, cy = (x1 + x2) // 2, (y1 + y2) // 2
-        for _ in range(random.randint(4, 9)):
-            w_shard, h_shard = random.randint(30, 200), random.randint(20, 150)
-            sx = max(0, min(cx - w_shard // 2 + random.randint(-60, 60), base_img.width - w_shard))
-            sy = max(0, min(cy - h_shard // 2 + random.randint(-60, 60), base_img.height - h_shard))
-            try:
-                shard = ImageEnhance.Contrast(ImageOps.invert(frame.crop((sx, sy, sx+w_shard, sy+h_shard)).convert("RGB"))).enhance(contrast_level)
-                frame.paste(shard, (sx, sy, sx+w_shard, sy+h_shard))
-            except: pass
-    return frame
-
-@st.cache_data(show_spinner=False, persist="disk")
-@st.cache_data(show_spinner=False, persist="disk")
-def generate_scaled_gif(img_path, real_boxes_orig, fake_boxes_orig, target_width, level_idx, glitch_seed):
-    try:
-        random.seed(glitch_seed)
-        base_img = Image.open(img_path).convert("RGB")
-        
-        # Calculate 16:9 aspect ratio
-        target_height = int(target_width * (9 / 16))
-        sf_width = target_width / base_img.width
-        sf_height = target_height / base_img.height
-        
-        base_img = base_img.resize((target_width, target_height), Image.Resampling.LANCZOS)
-        
-        scaled_real = [(int(x1*sf_width), int(y1*sf_height), int(x2*sf_width), int(y2*sf_height)) for x1,y1,x2,y2 in real_boxes_orig]
-        scaled_fake = [(int(x1*sf_width), int(y1*sf_height), int(x2*sf_width), int(y2*sf_height)) for x1,y1,x2,y2 in fake_boxes_orig]
-        
-        frames = [base_img.copy() for _ in range(15)]
-        for _ in range(8):
-            
-            # --- THIS IS THE FIX ---
-            # Use the *scaled* boxes to generate the frames, not the original ones.
-            frames.append(generate_mutating_frame(generate_mutating_frame(base_img, scaled_real, False), scaled_fake, True))
-            # --- END FIX ---
-
-        temp_file = f"/tmp/lvl_{level_idx}_{glitch_seed}.gif"
-        frames[0].save(temp_file, format="GIF", save_all=True, append_images=frames[1:], duration=[200]*15+[70]*8, loop=0)
-        return temp_file, scaled_real, scaled_fake
-    
+@metrics.timed("generate_scaled_gif")
+def generate_scaled_gif(img_path, real_boxes_orig, fake_boxes_orig, target_width, glitch_seed, out_format):
+    try: path, scaled_real, scaled_fake = render_layout(render_cache, img_path, real_boxes_orig, fake_boxes_orig, target_width, glitch_seed, out_format)
     except: return None, [], []
+    if metrics.ENABLED: metrics.payload("generate_scaled_gif", os.path.getsize(path))
+    return path, scaled_real, scaled_fake
 
 def validate_usn(usn): return re.match(r"^\d[A-Z]{2}\d{2}[A-Z]{2}\d{3}$", usn)
 
-# --- GOOGLE SHEETS ---
-conn = None
-try: conn = st.connection("gsheets", type=GSheetsConnection)
-except: pass
-
+# --- SCORE STORE ---
+@metrics.timed("save_score")
 def save_score(tag, name, usn, time_val):
+    """Hand a score to the score store. True once it is safely recorded or queued."""
     try:
-        scopes = [
-            "https://spreadsheets.google.com/feeds",
-            "https://www.googleapis.com/auth/drive"
-        ]
-        
-        creds_dict = st.secrets["connections"]["gsheets"]
-        creds = Credentials.from_service_account_info(creds_dict, scopes=scopes)
-        
-        client = gspread.authorize(creds)
-        
-        if "spreadsheet" not in creds_dict:
-            st.error("GSheets Error: 'spreadsheet' (URL) not found in secrets.")
-            return False
-            
-        spreadsheet_url = creds_dict["spreadsheet"]
-        sh = client.open_by_url(spreadsheet_url)
-
-        try:
-            worksheet = sh.worksheet("Scores")
-        except gspread.exceptions.WorksheetNotFound:
-            print("Worksheet 'Scores' not found, creating it.")
-            worksheet = sh.add_worksheet(title="Scores", rows=100, cols=4)
-            worksheet.append_row(["Tag", "Name", "USN", "Time"])
-            print("Worksheet 'Scores' created with headers.")
-
-        worksheet.append_row([
-            str(tag), 
-            str(name), 
-            str(usn), 
-            str(f"{time_val:.2f}")
-        ])
+        if score_store is None: raise RuntimeError("no score store available.")
+        score_store.submit(str(tag), str(name), str(usn), round(time_val, 2))
         return True
     except Exception as e:
-        print(f"GSheets Write Error: {e}")
-        st.error(f"GSheets Write Error: {e}")
+        print(f"Score Store Error: {e}")
+        st.error(f"Score Store Error: {e}")
         return False
 
+@metrics.timed("get_leaderboard")
 def get_leaderboard():
-    if conn:
-        try:
-            df = conn.read(worksheet="Scores", ttl=0, dtype=str)
-            df.columns = df.columns.str.strip()
-            if not all(c in df.columns for c in ['Tag', 'Name', 'USN', 'Time']): return pd.DataFrame(columns=["Rank", "Name", "USN", "Time"])
-            df['Time'] = pd.to_numeric(df['Time'].astype(str).str.replace(',', ''), errors='coerce')
-            df.dropna(subset=['Time', 'USN'], inplace=True)
-            if df.empty: return pd.DataFrame(columns=["Rank", "Name", "USN", "Time"])
-            df.sort_values(by='Time', ascending=True, inplace=True)
-            df['Rank'] = range(1, len(df) + 1)
-            df['Time'] = df['Time'].apply(lambda x: f"{x:.2f}s")
-            return df[['Rank', 'Name', 'USN', 'Time']].head(10).reset_index(drop=True)
-        except Exception: pass
+    if score_store:
+        try: top = score_store.top(LEADERBOARD_SIZE)
+        except Exception as e:
+            print(f"Leaderboard error: {e}")
+            top = []
+        if top: return pd.DataFrame({"Rank": range(1, len(top) + 1), "Name": [s.name for s in top],
+                                     "USN": [s.usn for s in top], "Time": [f"{s.time:.2f}s" for s in top]})
     return pd.DataFrame(columns=["Rank", "Name", "USN", "Time"])
 
-# --- MAIN INIT ---
-inject_css("167784-837438543.mp4")
+def get_player_rank(usn):
+    if not score_store or not validate_usn(usn): return None
+    try: return score_store.rank(usn)
+    except Exception as e:
+        print(f"Rank error: {e}")
+        return None
 
-def get_num_real_targets(level_idx): return 2 if level_idx == 2 else 1
+# --- MAIN INIT ---
+render_cache = get_render_cache(RENDER_CACHE_DIR, RENDER_CACHE_BYTES)
+get_warm_up().start()  # normally already started with the server (asgi.py); a no-op then
 
 if 'game_state' not in st.session_state:
     st.session_state.update({
@@ -347,15 +312,29 @@ if 'game_state' not in st.session_state:
         'glitch_seed': random.randint(1, 100000), 
         'real_boxes': [], 
         'fake_boxes': [], 
+        'glitch_render': None,
+        'client_formats': None,
+        'board_width': None,
+        'prefetcher': LayoutPrefetcher(render_cache, PREFETCH_DEPTH),
         'hits': 0,
-        'menu_music_playing': False,
-        'gameplay_music_playing': False,
-        # --- FIXED: Add placeholders for persistent audio ---
-        # This is the correct way: store the st.empty() object itself in state.
-        'menu_music_placeholder': st.empty(),
-        'game_music_placeholder': st.empty()
+        'audio_enabled': False,
+        'board_session': random.getrandbits(64),
+        'moves': 0,
+        'transitions': 0,
+        'transitions_shown': 0,
+        'notices': []
     })
 
+metrics.begin_rerun(session=st.session_state.board_session, state=st.session_state.game_state)
+score_store = open_score_store()
+inject_css(BACKGROUND_VIDEO)
+
+# Rendered before anything that varies between game states, so its frame (and the audio it preloaded) survives every rerun
+with metrics.span("audio_manager"):
+    audio_manager({state: asset_url(f) for state, f in MUSIC_TRACKS.items()}, {name: asset_url(f) for name, f in SOUND_EFFECTS.items()},
+                  music=st.session_state.game_state, enabled=st.session_state.audio_enabled, volume=AUDIO_VOLUME)
+render_effects()
+
 st.title("DETROIT: ANOMALY [09]")
 
 if st.session_state.game_state == "menu":
@@ -367,34 +346,27 @@ if st.session_state.game_state == "menu":
         </style>
         """, unsafe_allow_html=True)
     
-    # Add audio initialization button
-    if 'audio_enabled' not in st.session_state:
-        st.session_state.audio_enabled = False
-    
     # --- FIXED: "Enable Audio" button logic ---
     if not st.session_state.audio_enabled:
         st.warning("🔊 Audio is disabled. Click below to enable sound.")
         if st.button("🎵 ENABLE AUDIO", type="primary"):
             st.session_state.audio_enabled = True
-            # We play a sound *immediately* on this click to "unlock" 
-            # the browser's autoplay policy.
-            play_audio("541987__rob_marion__gasp_ui_clicks_5.wav", file_type="wav", audio_id="unlock-sound")
-            time.sleep(0.1) # Give it a tiny moment to register
+            # This click also "unlocks" the browser's autoplay policy
+            play_sfx("click")
             st.rerun()
     
-    # --- FIXED: Menu Music Logic ---
-    # This logic now runs on *every* rerun (e.g., typing)
-    if st.session_state.audio_enabled:
-        audio_html = play_background_music("537256__humanfobia__letargo-sumergido.mp3", file_type="mp3", audio_id="menu-music")
-        if audio_html:
-            # We must re-fill the placeholder on every run to keep it on the page
-            st.session_state.menu_music_placeholder.markdown(audio_html, unsafe_allow_html=True)
-            
-            # Only set the flag the *first* time
-            if not st.session_state.menu_music_playing:
-                st.session_state.menu_music_playing = True
-                st.session_state.gameplay_music_playing = False
-    
+    # Ask the browser once per session which animated image formats it decodes (server-rendered boards only)
+    if BOARD_RENDERER == "server" and st.session_state.client_formats is None:
+        probed = streamlit_js_eval(js_expressions=get_format_probe_js(), key="format-probe")
+        if probed is not None: st.session_state.client_formats = [f for f in probed.split(",") if f]
+
+    # ...and how wide its screen is, to pick the board's render tier
+    if st.session_state.board_width is None:
+        viewport = streamlit_js_eval(js_expressions=VIEWPORT_JS, key="viewport-probe")
+        if viewport:
+            viewport_width, pixel_ratio = map(float, str(viewport).split(","))
+            st.session_state.board_width = pick_render_tier(viewport_width, pixel_ratio)
+
     st.markdown("### OPERATIVE DATA INPUT")
     tag = st.text_input(">> AGENT TAG (3 CHARS):", max_chars=3, value=st.session_state.player_tag if st.session_state.player_tag != 'UNK' else '').upper()
     name = st.text_input(">> FULL NAME:", value=st.session_state.player_name)
@@ -402,13 +374,7 @@ if st.session_state.game_state == "menu":
     
     # --- FIXED: "Start Simulation" button logic ---
     if st.button(">> START SIMULATION <<", type="primary", disabled=(len(tag)!=3 or not name or not validate_usn(usn) or not st.session_state.audio_enabled)):
-        play_audio("541987__rob_marion__gasp_ui_clicks_5.wav", file_type="wav", audio_id="click-sound")
-        
-        # --- FIXED: Clear the menu music player ---
-        st.session_state.menu_music_placeholder.empty() # This empties the *content*
-        
-        time.sleep(0.3)
-        
+        play_sfx("click")
         st.session_state.update({
             'game_state': 'playing', 
             'player_tag': tag, 
@@ -416,9 +382,7 @@ if st.session_state.game_state == "menu":
             'player_usn': usn, 
             'start_time': time.time(), 
             'current_level': 0, 
-            'hits': 0,
-            'menu_music_playing': False, # Reset flag
-            'gameplay_music_playing': False # Reset flag
+            'hits': 0
         })
         move_glitch(get_num_real_targets(0))
         st.rerun()
@@ -444,9 +408,11 @@ if st.session_state.game_state == "menu":
     st.markdown("---")
     st.markdown("### GLOBAL RANKINGS")
     lb = get_leaderboard()
-    if conn and not lb.empty: st.dataframe(lb, hide_index=True, use_container_width=True)
-    elif conn: st.warning("WAITING FOR DATA LINK...")
+    if score_store and not lb.empty: st.dataframe(lb, hide_index=True, use_container_width=True)
+    elif score_store: st.warning("WAITING FOR DATA LINK...")
     else: st.error("CONNECTION SEVERED.")
+    rank = get_player_rank(usn)
+    if rank: st.markdown(f"YOUR BEST: {rank.time:.2f}s // RANK #{rank.rank}")
 
 elif st.session_state.game_state == "playing":
     # Hide video background
@@ -457,19 +423,6 @@ elif st.session_state.game_state == "playing":
         </style>
         """, unsafe_allow_html=True)
     
-    # --- FIXED: Gameplay Music Logic ---
-    # This also runs on every rerun (e.g., when clicking)
-    if st.session_state.audio_enabled:
-        audio_html = play_background_music("615546__projecteur__cosmic-dark-synthwave.mp3", file_type="mp3", audio_id="gameplay-music")
-        if audio_html:
-            # Re-fill the placeholder on every run
-            st.session_state.game_music_placeholder.markdown(audio_html, unsafe_allow_html=True)
-            
-            # Only set the flag the first time
-            if not st.session_state.gameplay_music_playing:
-                st.session_state.gameplay_music_playing = True
-                st.session_state.menu_music_playing = False
-
     lvl = st.session_state.current_level
     needed, targets = GLITCHES_PER_LEVEL[lvl], get_num_real_targets(lvl)
     c1, c2, c3 = st.columns(3)
@@ -478,64 +431,67 @@ elif st.session_state.game_state == "playing":
     c3.markdown(f"LVL: {lvl+1}/3")
     st.progress(st.session_state.hits/needed, text=f"Neutralized: {st.session_state.hits}/{needed}")
     
-    gif, scaled_real, scaled_fake = generate_scaled_gif(LEVEL_FILES[lvl], st.session_state.real_boxes, st.session_state.fake_boxes, GAME_WIDTH, lvl, st.session_state.glitch_seed)
-    if gif:
-        coords = streamlit_image_coordinates(gif, key=f"lvl_{lvl}_{st.session_state.glitch_seed}", width=GAME_WIDTH)
-        if coords:
-            cx, cy = coords['x'], coords['y']
-            hit = any((x1-HIT_TOLERANCE) <= cx <= (x2+HIT_TOLERANCE) and (y1-HIT_TOLERANCE) <= cy <= (y2+HIT_TOLERANCE) for x1,y1,x2,y2 in scaled_real)
-            fake_hit = any((x1-HIT_TOLERANCE) <= cx <= (x2+HIT_TOLERANCE) and (y1-HIT_TOLERANCE) <= cy <= (y2+HIT_TOLERANCE) for x1,y1,x2,y2 in scaled_fake)
+    # Boxes, clicks and tolerance are all in pixels of the board as rendered for this player's tier
+    width = board_width()
+    tolerance = hit_tolerance(width)
+    if BOARD_RENDERER == "client":
+        token = layout_token(st.session_state.board_session, lvl, st.session_state.glitch_seed, st.session_state.moves)
+        coords, scaled_real, scaled_fake = glitch_board(LEVEL_FILES[lvl], st.session_state.real_boxes, st.session_state.fake_boxes,
+                                                        width, st.session_state.glitch_seed, token, tolerance)
+    else:
+        # Pooled layouts need no image work; prefetched ones are usually already rendered
+        out_format = get_animation_format()
+        ready = get_layout_pool(LAYOUT_POOL_DIR).lookup(lvl, st.session_state.glitch_seed, width, out_format) or wait_for_render(st.session_state.glitch_render)
+        # A cancelled or evicted prefetch is rendered below (a render cache hit from then on), so drop it
+        if not ready: st.session_state.glitch_render = None
+        gif, scaled_real, scaled_fake = ready or generate_scaled_gif(LEVEL_FILES[lvl], st.session_state.real_boxes, st.session_state.fake_boxes, width, st.session_state.glitch_seed, out_format)
+        coords = streamlit_image_coordinates(gif, key=f"lvl_{lvl}_{st.session_state.glitch_seed}", width=width) if gif else None
+        if coords and coords.get('width'):
+            # The image may be displayed smaller than rendered (mobile CSS); map the click back to board pixels
+            coords = {'x': coords['x'] * width / coords['width'], 'y': coords['y'] * width / coords['width']}
+    if coords:
+        cx, cy = coords['x'], coords['y']
+        hit = any((x1-tolerance) <= cx <= (x2+tolerance) and (y1-tolerance) <= cy <= (y2+tolerance) for x1,y1,x2,y2 in scaled_real)
+        fake_hit = any((x1-tolerance) <= cx <= (x2+tolerance) and (y1-tolerance) <= cy <= (y2+tolerance) for x1,y1,x2,y2 in scaled_fake)
+        
+        if hit:
+            play_sfx("hit")
+            trigger_static_transition()
+            st.session_state.hits += 1
             
-            if hit:
-                play_audio("828680__jw_audio__uimisc_digital-interface-message-selection-confirmation-alert_10_jw-audio_user-interface.wav", file_type="wav", audio_id="hit-sound")
-                time.sleep(0.3)
-                
-                trigger_static_transition()
-                st.session_state.hits += 1
-                
-                if st.session_state.hits >= needed:
-                    if lvl < 2: 
-                        st.session_state.current_level += 1
-                        st.session_state.hits = 0
-                        move_glitch(get_num_real_targets(st.session_state.current_level))
-                    else: 
-                        st.session_state.final_time = time.time() - st.session_state.start_time
-                        st.session_state.game_state = 'game_over'
-                        
-                        # --- FIXED: Clear the game music player ---
-                        st.session_state.game_music_placeholder.empty()
-                        
-                        st.session_state.gameplay_music_playing = False # Reset flag
-                        st.session_state.menu_music_playing = False # Also reset menu flag
+            if st.session_state.hits >= needed:
+                if lvl < 2: 
+                    st.session_state.current_level += 1
+                    st.session_state.hits = 0
+                    move_glitch(get_num_real_targets(st.session_state.current_level))
                 else: 
-                    move_glitch(targets)
-                
-                st.rerun()
-                
-            elif fake_hit:
-                play_audio("713179__vein_adams__user-interface-beep-error-404-glitch.wav", file_type="wav", audio_id="decoy-sound")
-                time.sleep(0.3)
-                st.toast("DECOY NEUTRALIZED.", icon="⚠")
+                    st.session_state.final_time = time.time() - st.session_state.start_time
+                    st.session_state.game_state = 'game_over'
+                    st.session_state.prefetcher.cancel()
+            else: 
                 move_glitch(targets)
-                st.rerun()
             
-            else:
-                play_audio("541987__rob_marion__gasp_ui_clicks_5.wav", file_type="wav", audio_id="miss-sound")
-                time.sleep(0.3)
-                st.toast("MISS! RELOCATING...", icon="❌")
-                move_glitch(targets)
-                st.rerun()
+            st.rerun()
+            
+        elif fake_hit:
+            play_sfx("decoy")
+            notify("DECOY NEUTRALIZED.", "⚠")
+            move_glitch(targets)
+            st.rerun()
+        
+        else:
+            play_sfx("click")
+            notify("MISS! RELOCATING...", "❌")
+            move_glitch(targets)
+            st.rerun()
 
 elif st.session_state.game_state == "game_over":
     st.balloons()
     st.markdown(f"## MISSION COMPLETE\n*OPERATIVE:* {st.session_state.player_name}\n*TIME:* {st.session_state.final_time:.2f}s")
     if st.button(">> UPLOAD SCORE <<", type="primary"):
-        with st.spinner("UPLOADING..."):
-            if save_score(st.session_state.player_tag, st.session_state.player_name, st.session_state.player_usn, st.session_state.final_time): 
-                st.success("UPLOAD SUCCESSFUL.")
-            else: 
-                st.error("UPLOAD FAILED.")
-        time.sleep(1.5)
+        if save_score(st.session_state.player_tag, st.session_state.player_name, st.session_state.player_usn, st.session_state.final_time): 
+            notify("SCORE QUEUED. SYNCING TO GLOBAL RANKINGS...", "✅")
+        else: 
+            notify("UPLOAD FAILED.", "❌")
         st.session_state.game_state = 'menu'
-        st.session_state.menu_music_playing = False # Reset flag so menu music will play
         st.rerun()
\ No newline at end of file
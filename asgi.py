@@ -0,0 +1,60 @@
+"""ASGI entry point for production: `uvicorn asgi:app --host 0.0.0.0 --port 8501`.
+
+Serves the same app as `streamlit run app.py`, and additionally marks the
+content-hashed media published by static_assets.py as immutable, so browsers
+and CDNs keep it for a year instead of revalidating it on every visit.
+With METRICS=1 it also serves the process's metrics.py histograms and
+counters at /metrics, in Prometheus text format.
+
+The warm-up in warmup.py starts with the server; /ready answers 503 until it
+has finished and 200 after, both with its status as JSON, for load balancer
+readiness checks.
+"""
+import contextlib
+
+import streamlit as st
+from starlette.middleware import Middleware
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+import metrics
+from static_assets import CACHE_CONTROL, is_hashed_asset
+from warmup import get_warm_up
+
+
+class ImmutableStaticAssets:
+    """Pure ASGI middleware that sets a long-lived Cache-Control on hashed static files."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not is_hashed_asset(scope["path"]):
+            return await self.app(scope, receive, send)
+
+        async def send_with_cache_control(message):
+            if message["type"] == "http.response.start" and message["status"] in (200, 206, 304):
+                headers = [h for h in message.get("headers", []) if h[0].lower() != b"cache-control"]
+                message["headers"] = headers + [(b"cache-control", CACHE_CONTROL.encode())]
+            await send(message)
+
+        await self.app(scope, receive, send_with_cache_control)
+
+
+async def metrics_endpoint(request):
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE)
+
+
+async def ready_endpoint(request):
+    warm_up = get_warm_up()
+    return JSONResponse(warm_up.status(), status_code=200 if warm_up.ready else 503)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    get_warm_up().start()
+    yield
+
+
+routes = [Route("/ready", ready_endpoint)] + ([Route("/metrics", metrics_endpoint)] if metrics.ENABLED else [])
+app = st.App("app.py", lifespan=lifespan, routes=routes, middleware=[Middleware(ImmutableStaticAssets)])
@@ -0,0 +1,48 @@
+import json
+import os
+import random
+
+import streamlit as st
+import streamlit.components.v1 as components
+
+import metrics
+
+# --- AUDIO MANAGER ---
+# One hidden component per session owns all playback. It preloads the music
+# tracks and sound effects once; after that each rerun only sends the track
+# that should be playing (changes crossfade), the volume, and a short log of
+# numbered SFX events that the browser plays exactly once each. Because the
+# log survives reruns, a sound queued right before st.rerun() still plays.
+_component = components.declare_component(
+    "audio_manager", path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "components", "audio_manager"))
+
+SFX_LOG_SIZE = 8
+CROSSFADE_MS = 800
+
+
+def _state():
+    if "audio_manager" not in st.session_state:
+        st.session_state.audio_manager = {"session": random.getrandbits(48), "next_id": 1, "events": []}
+    return st.session_state.audio_manager
+
+
+def play_sfx(name):
+    """Queue the sound effect `name` for the browser; it plays on the next render of the audio manager."""
+    state = _state()
+    state["events"] = (state["events"] + [[state["next_id"], name]])[-SFX_LOG_SIZE:]
+    state["next_id"] += 1
+
+
+def audio_manager(tracks, sfx, music=None, enabled=True, volume=1.0, crossfade_ms=CROSSFADE_MS, key="audio-manager"):
+    """Render the session's audio component.
+
+    `tracks` and `sfx` map names to URLs (None entries are skipped); `music`
+    names the track that should be playing, or None for silence. Render it at
+    the same place on every run so the browser keeps its preloaded audio.
+    """
+    state = _state()
+    args = dict(tracks=tracks, sfx=sfx, music=music if enabled else None, enabled=enabled,
+                volume=max(0.0, min(1.0, volume)), crossfade_ms=crossfade_ms,
+                events=state["events"], session=state["session"])
+    if metrics.ENABLED: metrics.payload("audio_manager", len(json.dumps(args)))
+    _component(**args, key=key, default=None)
@@ -0,0 +1,294 @@
+"""Headless load and latency benchmark for app.py.
+
+    python benchmark.py --players 8 --games 2 --out benchmark.json
+
+Every simulated player runs in its own process (AppTest swaps process-wide
+Streamlit state on each run, so sessions cannot share one) and plays through
+menu -> start -> clicks (hits, decoys and misses) -> game over -> upload,
+with Google Sheets replaced by a local SQLite sheet shared by all players.
+The render cache, static files and score journal are shared as in production.
+Players wait for their process's warm-up (warmup.py) unless --cold is given.
+
+Results are grouped by phase: p50/p95/p99 rerun latency, bytes emitted per
+rerun, time spent in generate_scaled_gif and peak RSS of a player's process.
+A rerun is everything one interaction triggers, st.rerun() chains included.
+Compare the JSON written by two versions to spot regressions.
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import resource
+import sqlite3
+import sys
+import tempfile
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+PHASES = ["load", "menu", "start", "hit", "decoy", "miss", "upload"]
+
+
+# --- SHEETS STAND-IN ---
+class LocalSheet:
+    """The Scores worksheet as a SQLite table, with an optional simulated round trip.
+
+    Serves both sides of the Sheets integration: append() for the score queue
+    (like score_queue.SheetsWriter) and read() for the connection.
+    """
+
+    def __init__(self, path, latency=0.0):
+        self.path = path
+        self.latency = latency
+        with sqlite3.connect(path, timeout=30) as db:
+            db.execute("CREATE TABLE IF NOT EXISTS scores (tag TEXT, name TEXT, usn TEXT, time TEXT)")
+
+    def append(self, rows):
+        time.sleep(self.latency)
+        with sqlite3.connect(self.path, timeout=30) as db:
+            db.executemany("INSERT INTO scores VALUES (?, ?, ?, ?)", [tuple(map(str, r)) for r in rows])
+
+    def read(self):
+        import pandas as pd
+        time.sleep(self.latency)
+        with sqlite3.connect(self.path, timeout=30) as db:
+            rows = db.execute("SELECT tag, name, usn, time FROM scores").fetchall()
+        return pd.DataFrame(rows, columns=["Tag", "Name", "USN", "Time"], dtype=str)
+
+
+def _install_sheets_stand_in(path, latency):
+    """Route app.py's GSheetsConnection and the score queue's writer to one LocalSheet.
+
+    Connections read their secrets from the real secrets.toml rather than
+    AppTest's, so the sheet is bound here instead of through secrets.
+    """
+    sheet = LocalSheet(path, latency)
+    import streamlit_gsheets
+    from streamlit.connections import BaseConnection
+    import score_store
+
+    class LocalSheetsConnection(BaseConnection):
+        def _connect(self, **kwargs):
+            return sheet
+
+        def read(self, worksheet=None, ttl=None, dtype=None, **kwargs):
+            return self._instance.read()
+
+    streamlit_gsheets.GSheetsConnection = LocalSheetsConnection
+    score_store.get_sheets_writer = lambda creds: sheet
+
+
+# --- PROBES ---
+class Probe:
+    """Per-process counters for the rerun being measured."""
+
+    def __init__(self):
+        self.bytes = 0
+        self.gif_s = 0.0
+
+    def install(self):
+        from streamlit.runtime.forward_msg_queue import ForwardMsgQueue
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+        import renderer
+
+        enqueue, render_layout = ForwardMsgQueue.enqueue, renderer.render_layout
+
+        def counting_enqueue(queue, msg):
+            self.bytes += msg.ByteSize()
+            enqueue(queue, msg)
+
+        def timed_render_layout(*args, **kwargs):
+            # Only the script thread's calls are generate_scaled_gif; prefetch threads have no run context
+            if get_script_run_ctx(suppress_warning=True) is None: return render_layout(*args, **kwargs)
+            start = time.perf_counter()
+            try: return render_layout(*args, **kwargs)
+            finally: self.gif_s += time.perf_counter() - start
+
+        ForwardMsgQueue.enqueue = counting_enqueue
+        renderer.render_layout = timed_render_layout
+
+    def reset(self):
+        self.bytes, self.gif_s = 0, 0.0
+
+
+def peak_rss_kb():
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss // 1024 if sys.platform == "darwin" else rss  # bytes on macOS, KiB elsewhere
+
+
+# --- PLAYER ---
+class Player:
+    def __init__(self, index, opts, probe):
+        from streamlit.testing.v1 import AppTest
+        self.index, self.opts, self.probe = index, opts, probe
+        self.rng = random.Random(f"{opts.seed}:{index}")
+        self.samples = []
+        self.at = AppTest.from_file(APP, default_timeout=opts.timeout)
+        self.at.secrets["connections"] = {"gsheets": {"spreadsheet": opts.sheet}}
+
+    def step(self, phase, action=None):
+        """Apply `action` to the app, rerun it and record one sample."""
+        time.sleep(self.opts.think)
+        self.probe.reset()
+        start = time.perf_counter()
+        (action or self.at.run)()
+        latency = time.perf_counter() - start
+        self.samples.append((phase, latency, self.probe.bytes, self.probe.gif_s, peak_rss_kb()))
+        if self.at.exception: raise RuntimeError(f"{phase}: {self.at.exception[0].value}")
+
+    def button(self, label):
+        return next(b for b in self.at.button if label in b.label)
+
+    def fill_menu(self):
+        ss = self.at.session_state
+        ss["viewport-probe"] = self.opts.viewport
+        ss["format-probe"] = self.opts.formats
+        self.step("load")
+        self.step("menu", lambda: self.button("ENABLE AUDIO").click().run())
+        for field, value in zip(self.at.text_input, ["BOT", f"Player {self.index}", f"1BN00BM{self.index % 1000:03d}"]):
+            self.step("menu", lambda: field.input(value).run())
+
+    def aim(self, outcome):
+        """A board-pixel point that the app will judge as `outcome`, or None if this layout has none."""
+        from config import GAME_WIDTH, HIT_TOLERANCE
+        from layout import LEVEL_FILES
+        from renderer import load_level_base, scale_boxes
+        ss = self.at.session_state
+        width = ss.board_width or GAME_WIDTH
+        base, sf_width, sf_height = load_level_base(LEVEL_FILES[ss.current_level], width)
+        real, fake = scale_boxes(ss.real_boxes, sf_width, sf_height), scale_boxes(ss.fake_boxes, sf_width, sf_height)
+        tolerance = HIT_TOLERANCE * width / GAME_WIDTH
+        near = lambda x, y, boxes: any(x1 - tolerance <= x <= x2 + tolerance and y1 - tolerance <= y <= y2 + tolerance
+                                       for x1, y1, x2, y2 in boxes)
+        if outcome == "hit": points = [((x1 + x2) // 2, (y1 + y2) // 2) for x1, y1, x2, y2 in real]
+        elif outcome == "decoy": points = [((x1 + x2) // 2, (y1 + y2) // 2) for x1, y1, x2, y2 in fake]
+        else: points = [(x, y) for x in range(0, width, 20) for y in range(0, base.shape[0], 20) if not near(x, y, fake)]
+        points = [p for p in points if outcome == "hit" or not near(*p, real)]
+        return (self.rng.choice(points), width, base.shape[0]) if points else None
+
+    def click(self, outcome):
+        from glitch_board import layout_token
+        aimed = self.aim(outcome)
+        if aimed is None: return False
+        (x, y), width, height = aimed
+        ss = self.at.session_state
+        if self.opts.renderer == "client":
+            ss["glitch-board"] = [layout_token(ss.board_session, ss.current_level, ss.glitch_seed, ss.moves), x, y]
+        else:
+            ss[f"lvl_{ss.current_level}_{ss.glitch_seed}"] = {"x": x, "y": y, "width": width, "height": height,
+                                                               "unix_time": time.time()}
+        self.step(outcome)
+        return True
+
+    def play(self):
+        self.step("start", lambda: self.button("START SIMULATION").click().run())
+        while self.at.session_state.game_state == "playing":
+            roll = self.rng.random()
+            outcome = "decoy" if roll < self.opts.decoy_rate else "miss" if roll < self.opts.decoy_rate + self.opts.miss_rate else "hit"
+            if not self.click(outcome): self.click("hit")
+        self.step("upload", lambda: self.button("UPLOAD SCORE").click().run())
+
+
+def run_player(index, opts):
+    """Play `opts.games` games as player `index`; returns (samples, error or None)."""
+    os.environ["BOARD_RENDERER"] = opts.renderer
+    os.environ["SCORE_JOURNAL"] = opts.journal
+    player = None
+    try:
+        _install_sheets_stand_in(opts.sheet, opts.sheets_latency)
+        probe = Probe()
+        probe.install()
+        if not opts.cold:
+            # As behind a load balancer polling /ready: no traffic until the process has warmed up
+            from warmup import get_warm_up
+            get_warm_up().start()
+            while not get_warm_up().ready: time.sleep(0.05)
+        player = Player(index, opts, probe)
+        player.fill_menu()
+        for _ in range(opts.games): player.play()
+        return player.samples, None
+    except Exception:
+        return (player.samples if player else []), f"player {index}: {traceback.format_exc()}"
+
+
+# --- REPORT ---
+def percentile(values, p):
+    """Nearest-rank percentile of a non-empty list."""
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+def summarize(samples):
+    phases = {}
+    for phase in PHASES:
+        rows = [s for s in samples if s[0] == phase]
+        if not rows: continue
+        latency_ms = [s[1] * 1000 for s in rows]
+        sizes = [s[2] for s in rows]
+        gif_ms = [s[3] * 1000 for s in rows]
+        phases[phase] = {
+            "reruns": len(rows),
+            "latency_ms": {f"p{p}": round(percentile(latency_ms, p), 2) for p in (50, 95, 99)} | {"max": round(max(latency_ms), 2)},
+            "bytes_per_rerun": {"mean": round(sum(sizes) / len(sizes)), "p95": percentile(sizes, 95), "max": max(sizes)},
+            "generate_scaled_gif_ms": {"total": round(sum(gif_ms), 2), "mean": round(sum(gif_ms) / len(gif_ms), 2),
+                                       "p95": round(percentile(gif_ms, 95), 2)},
+            "peak_rss_mb": round(max(s[4] for s in rows) / 1024, 1),
+        }
+    return phases
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive simulated players through app.py and report per-phase latency.")
+    parser.add_argument("--players", type=int, default=4, help="concurrent players, one process each (default: 4)")
+    parser.add_argument("--games", type=int, default=1, help="games per player (default: 1)")
+    parser.add_argument("--renderer", default="client", choices=["client", "server"], help="BOARD_RENDERER to benchmark (default: client)")
+    parser.add_argument("--decoy-rate", type=float, default=0.15, help="share of clicks aimed at a decoy (default: 0.15)")
+    parser.add_argument("--miss-rate", type=float, default=0.15, help="share of clicks aimed at empty space (default: 0.15)")
+    parser.add_argument("--think", type=float, default=0.2, help="seconds between interactions, not timed (default: 0.2)")
+    parser.add_argument("--viewport", default="1280,1", help="reported 'width,pixel_ratio' of the browser (default: 1280,1)")
+    parser.add_argument("--formats", default="webp", help="animated formats the browser reports decoding (default: webp)")
+    parser.add_argument("--sheets-latency", type=float, default=0.0, help="simulated Sheets round trip in seconds (default: 0)")
+    parser.add_argument("--cold", action="store_true", help="start playing without waiting for the server warm-up")
+    parser.add_argument("--timeout", type=float, default=60, help="seconds allowed per rerun (default: 60)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the players' choices (default: 0)")
+    parser.add_argument("--out", default="benchmark.json", help="JSON results file (default: benchmark.json)")
+    opts = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="detroit-bench-") as tmp:
+        opts.sheet, opts.journal = os.path.join(tmp, "sheet.db"), os.path.join(tmp, "journal.db")
+        LocalSheet(opts.sheet)
+        start = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=opts.players) as executor:
+            results = list(executor.map(run_player, range(opts.players), [opts] * opts.players))
+        wall = time.perf_counter() - start
+        scores = len(LocalSheet(opts.sheet).read())
+        with sqlite3.connect(opts.journal) as db:
+            try: pending = db.execute("SELECT COUNT(*) FROM pending").fetchone()[0]
+            except sqlite3.OperationalError: pending = 0
+
+    samples = [s for player_samples, _ in results for s in player_samples]
+    errors = [e for _, e in results if e]
+    report = {
+        "config": {k: v for k, v in vars(opts).items() if k not in ("sheet", "journal", "out")},
+        "environment": {"python": platform.python_version(), "cpus": os.cpu_count(), "platform": platform.platform()},
+        "wall_s": round(wall, 2),
+        "reruns": len(samples),
+        "scores": {"synced": scores, "pending": pending},
+        "phases": summarize(samples),
+        "errors": errors,
+    }
+    with open(opts.out, "w") as f: json.dump(report, f, indent=1)
+
+    print(f"{len(samples)} reruns by {opts.players} players in {wall:.1f}s, {len(errors)} errors -> {opts.out}")
+    for phase, stats in report["phases"].items():
+        lat = stats["latency_ms"]
+        print(f"  {phase:<7} n={stats['reruns']:<5} p50={lat['p50']:>8.1f}ms p95={lat['p95']:>8.1f}ms p99={lat['p99']:>8.1f}ms "
+              f"bytes={stats['bytes_per_rerun']['mean']:>8} gif={stats['generate_scaled_gif_ms']['mean']:>7.1f}ms rss={stats['peak_rss_mb']}MB")
+    for error in errors: print(error, file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
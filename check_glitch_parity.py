@@ -0,0 +1,106 @@
+"""Check that the browser renderer still draws exactly what the server draws.
+
+    python check_glitch_parity.py --seeds 5
+
+components/glitch_board/glitch.js is a hand port of the shard renderer in
+renderer.py (MT19937 seeding, randint, frame sub-seeds and the fixed-point
+contrast maths), so any change to mutate_frame, frame_seed or the shard draws
+must be mirrored there. This renders layouts of every level at every render
+tier with both, by running glitch.js under node, and compares the frames
+pixel for pixel, reporting the first differing pixel of each layout and
+exiting non-zero on any mismatch. Run it whenever renderer.py or glitch.js
+changes.
+"""
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+import config
+from layout import LEVEL_FILES, get_num_real_targets, make_layout
+from renderer import GLITCH_FRAMES, load_level_base, render_glitch_frames, scale_boxes
+
+GLITCH_JS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "components", "glitch_board", "glitch.js")
+
+# Reads a JSON job list on stdin: {"randint": [[seed, a, b, n], ...]} returns the draws,
+# {"frames": [{base, width, height, real, fake, seed, count, out}, ...]} writes each layout's RGBA frames to `out`
+NODE_SCRIPT = """
+const fs = require("fs");
+const {PyRandom, renderGlitchFrames} = require(process.argv[1]);
+const jobs = JSON.parse(fs.readFileSync(0, "utf8"));
+const draws = jobs.randint.map(([seed, a, b, n]) => { const r = new PyRandom(seed); return Array.from({length: n}, () => r.randint(a, b)); });
+for (const j of jobs.frames) {
+  const base = new Uint8ClampedArray(fs.readFileSync(j.base));
+  const frames = renderGlitchFrames(base, j.width, j.height, j.real, j.fake, j.seed, j.count);
+  fs.writeFileSync(j.out, Buffer.concat(frames.map(f => Buffer.from(f.buffer, f.byteOffset, f.byteLength))));
+}
+console.log(JSON.stringify(draws));
+"""
+
+# Seeds past 32 bits exercise PyRandom's multi-word seeding, negatives its abs()
+RANDINT_SEEDS = (0, 1, 42, 99999, -7, 2**32 + 1, 2**40 + 7)
+
+
+def run_node(node, jobs):
+    done = subprocess.run([node, "-e", NODE_SCRIPT, GLITCH_JS], input=json.dumps(jobs),
+                          capture_output=True, text=True, check=True)
+    return json.loads(done.stdout)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare glitch.js frames with renderer.py frames pixel for pixel.")
+    parser.add_argument("--seeds", type=int, default=3, help="layouts per level and tier (default: 3)")
+    parser.add_argument("--widths", type=int, nargs="+", default=list(config.RENDER_TIERS),
+                        help="render widths to check (default: every RENDER_TIERS width)")
+    parser.add_argument("--node", default="node", help="node executable (default: node)")
+    parser.add_argument("--seed", type=int, default=0, help="seed for picking layout seeds (default: 0)")
+    opts = parser.parse_args()
+
+    rng = random.Random(opts.seed)
+    randint = [(s, a, b, 20) for s in RANDINT_SEEDS for a, b in ((-60, 60), (4, 9), (0, config.GAME_WIDTH))]
+    expected = [[r.randint(a, b) for _ in range(n)] for s, a, b, n in randint for r in [random.Random(s)]]
+
+    with tempfile.TemporaryDirectory(prefix="detroit-parity-") as tmp:
+        frames, cases = [], []
+        for level, img_path in enumerate(LEVEL_FILES):
+            for width in opts.widths:
+                base, sf_width, sf_height = load_level_base(img_path, width)
+                height = base.shape[0]
+                base_path = os.path.join(tmp, f"base-{level}-{width}.rgba")
+                with open(base_path, "wb") as f: f.write(np.dstack([base, np.full((height, width), 255, np.uint8)]).tobytes())
+                for seed in rng.sample(range(1, 100001), opts.seeds):
+                    real_boxes, fake_boxes = make_layout(level, seed, get_num_real_targets(level))
+                    scaled_real, scaled_fake = scale_boxes(real_boxes, sf_width, sf_height), scale_boxes(fake_boxes, sf_width, sf_height)
+                    out = os.path.join(tmp, f"frames-{level}-{width}-{seed}.rgba")
+                    frames.append({"base": base_path, "width": width, "height": height, "real": scaled_real,
+                                   "fake": scaled_fake, "seed": seed, "count": GLITCH_FRAMES, "out": out})
+                    cases.append((level, width, seed, base, scaled_real, scaled_fake, out))
+
+        draws = run_node(opts.node, {"randint": randint, "frames": frames})
+        failures = [f"PyRandom({s}).randint({a}, {b}): python {e[:5]}..., glitch.js {d[:5]}..."
+                    for (s, a, b, _), e, d in zip(randint, expected, draws) if e != d]
+
+        for level, width, seed, base, scaled_real, scaled_fake, out in cases:
+            height = base.shape[0]
+            js_frames = np.fromfile(out, np.uint8).reshape(GLITCH_FRAMES, height, width, 4)[..., :3]
+            for i, frame in enumerate(render_glitch_frames(base, scaled_real, scaled_fake, seed, GLITCH_FRAMES)):
+                diff = np.argwhere(np.any(frame != js_frames[i], axis=2))
+                if diff.size:
+                    y, x = diff[0]
+                    failures.append(f"level {level + 1}, width {width}, seed {seed}, frame {i}: {len(diff)} pixels differ, "
+                                    f"first at ({x}, {y}): python {frame[y, x].tolist()}, glitch.js {js_frames[i][y, x].tolist()}")
+                    break
+
+    for failure in failures: print(failure)
+    print(f"{len(randint)} randint sequences and {len(cases)} layouts x {GLITCH_FRAMES} frames checked, "
+          f"{len(failures)} mismatches")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
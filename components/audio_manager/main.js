@@ -0,0 +1,112 @@
+// Session audio for DETROIT: ANOMALY. Owns every <audio> element: tracks and
+// sound effects are preloaded once, then each render only says which track
+// should be playing, the volume, and a short log of numbered SFX events.
+
+function sendMessage(type, data) {
+  window.parent.postMessage(Object.assign({isStreamlitMessage: true, type: type}, data), "*");
+}
+
+const players = {};      // url -> preloaded HTMLAudioElement
+const fades = new Map(); // audio -> interval id
+let music = null;        // {name, audio} of the current track
+let args = {};
+let blocked = false;     // last play() was refused by the autoplay policy
+
+// Static asset URLs are relative to the app page, not to this frame
+const pageUrl = (() => { try { return window.parent.location.href; } catch (e) { return document.referrer; } })();
+
+function player(url, loop) {
+  if (!players[url]) {
+    const audio = new Audio();
+    audio.preload = "auto";
+    audio.loop = loop;
+    audio.src = new URL(url, pageUrl).href;
+    players[url] = audio;
+  }
+  return players[url];
+}
+
+function play(audio) {
+  const started = audio.play();
+  if (started) started.then(() => { blocked = false; }, () => { blocked = true; });
+}
+
+function fade(audio, to, ms, done) {
+  clearInterval(fades.get(audio));
+  const from = audio.volume, steps = Math.max(1, Math.round(ms / 40));
+  let step = 0;
+  fades.set(audio, setInterval(() => {
+    step += 1;
+    audio.volume = Math.min(1, Math.max(0, from + (to - from) * step / steps));
+    if (step >= steps) {
+      clearInterval(fades.get(audio));
+      fades.delete(audio);
+      if (done) done();
+    }
+  }, 40));
+}
+
+function setMusic(name) {
+  if ((music ? music.name : null) === name) return;
+  const url = name && args.tracks[name];
+  const ms = args.crossfade_ms, volume = args.volume;
+  if (music && music.name !== name) {
+    const old = music.audio;
+    fade(old, 0, ms, () => { old.pause(); old.currentTime = 0; });
+  }
+  music = null;
+  if (!url) return;
+  const audio = player(url, true);
+  music = {name: name, audio: audio};
+  audio.volume = 0;
+  play(audio);
+  fade(audio, volume, ms);
+}
+
+// Events carry ids that only grow within a Streamlit session; the highest one
+// handled is kept in sessionStorage so a remounted frame does not replay them.
+function lastEvent(session) {
+  const saved = JSON.parse(sessionStorage.getItem("audio-manager") || "{}");
+  return saved.session === session ? saved.id : 0;
+}
+
+function playEvents(events, session, enabled) {
+  let last = lastEvent(session);
+  for (const [id, name] of events) {
+    if (id <= last) continue;
+    last = id;
+    const url = args.sfx[name];
+    if (!enabled || !url) continue;
+    const base = player(url, false);
+    const audio = base.paused || base.ended ? base : base.cloneNode();
+    audio.currentTime = 0;
+    audio.volume = args.volume;
+    play(audio);
+  }
+  sessionStorage.setItem("audio-manager", JSON.stringify({session: session, id: last}));
+}
+
+function render(next) {
+  args = next;
+  for (const url of Object.values(args.tracks)) if (url) player(url, true);
+  for (const url of Object.values(args.sfx)) if (url) player(url, false);
+  if (music && !fades.has(music.audio)) music.audio.volume = args.volume;
+  setMusic(args.enabled ? args.music : null);
+  playEvents(args.events, args.session, args.enabled);
+}
+
+// A refused autoplay is retried on the player's next interaction with the page
+function retryBlocked() {
+  if (blocked && music) play(music.audio);
+}
+try {
+  window.parent.document.addEventListener("pointerdown", retryBlocked, true);
+} catch (e) {
+  window.addEventListener("pointerdown", retryBlocked, true);
+}
+
+window.addEventListener("message", (event) => {
+  if (event.data.type === "streamlit:render") render(event.data.args);
+});
+sendMessage("streamlit:componentReady", {apiVersion: 1});
+sendMessage("streamlit:setFrameHeight", {height: 0});
@@ -0,0 +1,127 @@
+// Browser port of the glitch shard renderer in renderer.py. PyRandom
+// reproduces Python's random.Random (MT19937, int seeds, randint) so a seed
+// yields the same shards in both places; mutateFrame replays mutate_frame
+// on RGBA ImageData pixels. check_glitch_parity.py compares both renderers
+// frame by frame; run it after changing either.
+
+class PyRandom {
+  constructor(seed) {
+    this.mt = new Uint32Array(624);
+    this.index = 624;
+    this.initByArray(PyRandom.seedKey(seed));
+  }
+
+  static seedKey(seed) {
+    // Python seeds an int by its absolute value, split into 32-bit words
+    let n = BigInt(seed);
+    if (n < 0n) n = -n;
+    const key = [];
+    do { key.push(Number(n & 0xffffffffn)); n >>= 32n; } while (n > 0n);
+    return key;
+  }
+
+  initGenrand(s) {
+    const mt = this.mt;
+    mt[0] = s >>> 0;
+    for (let i = 1; i < 624; i++) {
+      const prev = mt[i - 1] ^ (mt[i - 1] >>> 30);
+      mt[i] = (Math.imul(1812433253, prev) + i) >>> 0;
+    }
+    this.index = 624;
+  }
+
+  initByArray(key) {
+    const mt = this.mt;
+    this.initGenrand(19650218);
+    let i = 1, j = 0;
+    for (let k = Math.max(624, key.length); k > 0; k--) {
+      const prev = mt[i - 1] ^ (mt[i - 1] >>> 30);
+      mt[i] = ((mt[i] ^ Math.imul(prev, 1664525)) + key[j] + j) >>> 0;
+      i++; j++;
+      if (i >= 624) { mt[0] = mt[623]; i = 1; }
+      if (j >= key.length) j = 0;
+    }
+    for (let k = 623; k > 0; k--) {
+      const prev = mt[i - 1] ^ (mt[i - 1] >>> 30);
+      mt[i] = ((mt[i] ^ Math.imul(prev, 1566083941)) - i) >>> 0;
+      i++;
+      if (i >= 624) { mt[0] = mt[623]; i = 1; }
+    }
+    mt[0] = 0x80000000;
+  }
+
+  uint32() {
+    const mt = this.mt;
+    if (this.index >= 624) {
+      for (let k = 0; k < 624; k++) {
+        const y = (mt[k] & 0x80000000) | (mt[(k + 1) % 624] & 0x7fffffff);
+        mt[k] = mt[(k + 397) % 624] ^ (y >>> 1) ^ (y & 1 ? 0x9908b0df : 0);
+      }
+      this.index = 0;
+    }
+    let y = mt[this.index++];
+    y ^= y >>> 11;
+    y ^= (y << 7) & 0x9d2c5680;
+    y ^= (y << 15) & 0xefc60000;
+    y ^= y >>> 18;
+    return y >>> 0;
+  }
+
+  randint(a, b) {
+    // random.randrange via _randbelow_with_getrandbits; ranges here are far below 2**32
+    const n = b - a + 1, k = 32 - Math.clz32(n);
+    let r = this.uint32() >>> (32 - k);
+    while (r >= n) r = this.uint32() >>> (32 - k);
+    return a + r;
+  }
+}
+
+const REAL_CONTRAST = 3, FAKE_CONTRAST = 1;
+
+function mutateFrame(px, width, height, boxes, rng, isFake) {
+  const contrast = isFake ? FAKE_CONTRAST : REAL_CONTRAST;
+  for (const [x1, y1, x2, y2] of boxes) {
+    const cx = Math.floor((x1 + x2) / 2), cy = Math.floor((y1 + y2) / 2);
+    for (let s = rng.randint(4, 9); s > 0; s--) {
+      const ws = rng.randint(30, 200), hs = rng.randint(20, 150);
+      const sx = Math.max(0, Math.min(cx - Math.floor(ws / 2) + rng.randint(-60, 60), width - ws));
+      const sy = Math.max(0, Math.min(cy - Math.floor(hs / 2) + rng.randint(-60, 60), height - hs));
+      const ex = Math.min(sx + ws, width), ey = Math.min(sy + hs, height);
+      let luma = 0;
+      for (let y = sy; y < ey; y++) {
+        for (let i = (y * width + sx) * 4, end = (y * width + ex) * 4; i < end; i += 4) {
+          px[i] = 255 - px[i]; px[i + 1] = 255 - px[i + 1]; px[i + 2] = 255 - px[i + 2];
+          luma += (px[i] * 19595 + px[i + 1] * 38470 + px[i + 2] * 7471 + 0x8000) >>> 16;
+        }
+      }
+      if (contrast === 1) continue;
+      // Crops past the frame edge are padded with black, which inverts to white
+      const padding = ws * hs - (ex - sx) * (ey - sy);
+      const mean = Math.floor((luma + 255 * padding) / (ws * hs) + 0.5);
+      const offset = (contrast - 1) * mean;
+      for (let y = sy; y < ey; y++) {
+        for (let i = (y * width + sx) * 4, end = (y * width + ex) * 4; i < end; i += 4) {
+          px[i] = px[i] * contrast - offset; px[i + 1] = px[i + 1] * contrast - offset; px[i + 2] = px[i + 2] * contrast - offset;
+        }
+      }
+    }
+  }
+}
+
+// Same as renderer.render_glitch_frames: frame f draws from its own generator
+// seeded with frame_seed(seed, f), real shards first, then decoys
+const FRAME_SEED_STRIDE = 1000;
+
+function renderGlitchFrames(base, width, height, real, fake, seed, count) {
+  const frames = [];
+  for (let f = 0; f < count; f++) {
+    const rng = new PyRandom(seed * FRAME_SEED_STRIDE + f);
+    const px = new Uint8ClampedArray(base);
+    mutateFrame(px, width, height, real, rng, false);
+    mutateFrame(px, width, height, fake, rng, true);
+    frames.push(px);
+  }
+  return frames;
+}
+
+if (typeof module !== "undefined") module.exports = {PyRandom, mutateFrame, renderGlitchFrames};
@@ -0,0 +1,94 @@
+// Game board for DETROIT: ANOMALY. Draws the level, renders the glitch
+// animation from the layout's seed (glitch.js), hit-tests clicks locally for
+// instant feedback, and reports each click once as [token, x, y]. The server
+// re-checks the point against its own boxes; the token ties the click to the
+// layout it was made on.
+
+function sendMessage(type, data) {
+  window.parent.postMessage(Object.assign({isStreamlitMessage: true, type: type}, data), "*");
+}
+
+const pageUrl = (() => { try { return window.parent.location.href; } catch (e) { return document.referrer; } })();
+
+let canvas, ctx;
+let layout = null;      // args of the layout on screen
+let frames = [];        // ImageData: base first, then the glitched frames
+let started = 0;        // animation clock origin
+let accepting = false;  // one click per layout
+let feedback = null;    // {color, until} flash drawn over the board
+let wanted = null;      // token of the newest layout received, which wins over slower earlier ones
+const images = {};      // url -> Promise<ImageData> of the level base
+
+function loadBase(url, width, height) {
+  if (!images[url]) {
+    images[url] = new Promise((resolve, reject) => {
+      const img = new Image();
+      img.onload = () => {
+        const scratch = document.createElement("canvas");
+        scratch.width = width; scratch.height = height;
+        const sctx = scratch.getContext("2d", {willReadFrequently: true});
+        sctx.drawImage(img, 0, 0, width, height);
+        resolve(sctx.getImageData(0, 0, width, height));
+      };
+      img.onerror = reject;
+      img.src = new URL(url, pageUrl).href;
+    });
+  }
+  return images[url];
+}
+
+function inside(x, y, boxes, tolerance) {
+  return boxes.some(([x1, y1, x2, y2]) => x1 - tolerance <= x && x <= x2 + tolerance && y1 - tolerance <= y && y <= y2 + tolerance);
+}
+
+async function render(args) {
+  if (args.token === wanted) return;
+  wanted = args.token;
+  const base = await loadBase(args.image, args.width, args.height);
+  if (args.token !== wanted) return;
+  const pixels = renderGlitchFrames(base.data, args.width, args.height, args.real, args.fake, args.seed, args.frames);
+  layout = args;
+  frames = [base].concat(pixels.map((px) => new ImageData(px, args.width, args.height)));
+  canvas.width = args.width; canvas.height = args.height;
+  started = performance.now();
+  accepting = true;
+  feedback = null;
+  sendMessage("streamlit:setFrameHeight", {height: canvas.getBoundingClientRect().height});
+}
+
+function draw(now) {
+  requestAnimationFrame(draw);
+  if (!layout) return;
+  const cycle = layout.hold_ms + layout.frames * layout.frame_ms;
+  const t = (now - started) % cycle;
+  const index = t < layout.hold_ms ? 0 : 1 + Math.min(layout.frames - 1, Math.floor((t - layout.hold_ms) / layout.frame_ms));
+  ctx.putImageData(frames[index], 0, 0);
+  if (feedback && now < feedback.until) {
+    ctx.fillStyle = feedback.color;
+    ctx.fillRect(0, 0, canvas.width, canvas.height);
+  }
+}
+
+function onClick(event) {
+  if (!layout || !accepting) return;
+  const rect = canvas.getBoundingClientRect();
+  const x = Math.round((event.clientX - rect.left) * layout.width / rect.width);
+  const y = Math.round((event.clientY - rect.top) * layout.height / rect.height);
+  accepting = false;
+  // Local verdict for instant feedback only; the server decides the outcome
+  if (inside(x, y, layout.real, layout.tolerance)) feedback = {color: "rgba(255, 255, 255, 0.35)", until: performance.now() + 120};
+  else if (inside(x, y, layout.fake, layout.tolerance)) feedback = {color: "rgba(255, 140, 0, 0.25)", until: performance.now() + 120};
+  sendMessage("streamlit:setComponentValue", {value: [layout.token, x, y]});
+}
+
+window.addEventListener("DOMContentLoaded", () => {
+  canvas = document.getElementById("board");
+  ctx = canvas.getContext("2d");
+  canvas.addEventListener("pointerdown", onClick);
+  window.addEventListener("resize", () => sendMessage("streamlit:setFrameHeight", {height: canvas.getBoundingClientRect().height}));
+  window.addEventListener("message", (event) => {
+    if (event.data.type === "streamlit:render") render(event.data.args).catch((e) => console.error("glitch board:", e));
+  });
+  sendMessage("streamlit:componentReady", {apiVersion: 1});
+  requestAnimationFrame(draw);
+});
@@ -0,0 +1,38 @@
+import os
+import tempfile
+
+# --- CONFIGURATION ---
+# Read by app.py on every run, and by warmup.py when the server starts, before
+# any session exists.
+
+GAME_WIDTH = 1200  # largest board width; HIT_TOLERANCE is in pixels at this width
+HIT_TOLERANCE = 150
+RENDER_TIERS = (480, 640, 800, 960, GAME_WIDTH)  # board widths the server renders, picked per viewport
+MAX_PIXEL_RATIO = 2  # sharper than 2x is not worth the bytes on a phone
+BOARD_RENDERER = os.environ.get("BOARD_RENDERER", "client")  # "client": the browser animates and hit-tests from the seed; "server": encoded animations (pool, prefetch, cache)
+
+GLITCHES_PER_LEVEL = [3, 5, 7]
+PREFETCH_DEPTH = 3
+LAYOUT_POOL_DIR = "pool"  # built offline with `python layout_pool.py`
+RENDER_CACHE_DIR = os.path.join(tempfile.gettempdir(), "detroit-anomaly-renders")  # shared by every worker process on the host
+RENDER_CACHE_BYTES = 512 * 1024 * 1024
+
+ANIMATION_FORMAT = "auto"  # "gif", "webp", "avif", or "auto" for the best one the player's browser decodes
+ANIMATION_QUALITY = 75  # WebP/AVIF only
+ANIMATION_MAX_BYTES = 600_000  # WebP/AVIF quality steps down until a layout fits; 0 disables
+
+MUSIC_TRACKS = {"menu": "537256__humanfobia__letargo-sumergido.mp3", "playing": "615546__projecteur__cosmic-dark-synthwave.mp3"}  # keyed by game_state
+SOUND_EFFECTS = {
+    "click": "541987__rob_marion__gasp_ui_clicks_5.wav",
+    "hit": "828680__jw_audio__uimisc_digital-interface-message-selection-confirmation-alert_10_jw-audio_user-interface.wav",
+    "decoy": "713179__vein_adams__user-interface-beep-error-404-glitch.wav",
+    "static": "static-noise.wav",
+}
+AUDIO_VOLUME = 1.0
+BACKGROUND_VIDEO = "167784-837438543.mp4"  # menu background
+
+LEADERBOARD_TTL = 60  # seconds between full reloads of the Scores sheet, shared by all sessions
+LEADERBOARD_SIZE = 10
+SCORE_STORE = "sheets"  # "sheets" (Google Sheets, see secrets) or "sqlite" (local SCORE_DB, for offline play and load tests)
+SCORE_DB = "scores.db"
+SCORE_JOURNAL = os.environ.get("SCORE_JOURNAL", "score_journal.db")  # SQLite write-behind journal; scores wait here until the sheet accepts them
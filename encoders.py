@@ -0,0 +1,187 @@
+import base64
+import functools
+import io
+from typing import NamedTuple
+
+import numpy as np
+from PIL import GifImagePlugin, Image, features
+
+# --- ANIMATION ENCODERS ---
+# Every glitch animation is one static base frame plus a few frames that only
+# differ from it around the boxes. The delta GIF encoder stores the base once
+# and each glitched frame as the bounding rectangle of its changed pixels,
+# drawn over the base and restored afterwards (GIF disposal 3). Boxes and
+# decoys are spread over the board, so that rectangle often covers most of
+# it; pixels inside it that match the base are written as the transparent
+# index, whose long runs LZW compresses to almost nothing. All frames share
+# one palette computed per level, so nothing is re-quantized per frame.
+
+DISPOSE_NONE, DISPOSE_PREVIOUS = 1, 3
+TRANSPARENT = 255  # palette index left out of build_palette, so patches can show the base through
+
+
+def build_palette(base, colors=TRANSPARENT):
+    """Adaptive palette for a level's base frame and the inverted, contrast-boosted
+    colours its glitch shards produce, as a P-mode image usable with quantize().
+    Its colours stop short of TRANSPARENT."""
+    inverted = 255 - base
+    boosted = np.clip(inverted.astype(np.int16) * 3 - 2 * int(inverted.mean()), 0, 255).astype(np.uint8)
+    sample = Image.fromarray(np.concatenate([base, inverted, boosted]))
+    return sample.quantize(colors, method=Image.Quantize.MEDIANCUT, dither=Image.Dither.NONE)
+
+
+def quantize(rgb, palette):
+    return Image.fromarray(rgb).quantize(palette=palette, dither=Image.Dither.NONE)
+
+
+def changed_bbox(base, frame):
+    """(x1, y1, x2, y2) bounding the pixels where `frame` differs from `base`, or None."""
+    diff = np.any(base != frame, axis=2)
+    rows = np.flatnonzero(diff.any(axis=1))
+    if not rows.size: return None
+    cols = np.flatnonzero(diff.any(axis=0))
+    return int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1
+
+
+def encode_delta_gif(base, base_p, palette, base_duration, frames, loop=0):
+    """Encode a looping GIF of `base` shown for `base_duration` ms followed by `frames`.
+
+    `frames` yields (rgb_array, duration_ms) pairs and is consumed lazily.
+    `base_p` is `base` already quantized to `palette`. Consecutive identical
+    frames are collapsed into one with their durations summed.
+    """
+    out = io.BytesIO()
+    header, _ = GifImagePlugin.getheader(base_p.copy(), info={"loop": loop, "optimize": False})
+    out.writelines(header)
+
+    def write(patch, offset, duration, disposal):
+        transparency = {} if disposal == DISPOSE_NONE else {"transparency": TRANSPARENT}
+        out.writelines(GifImagePlugin.getdata(patch, offset=offset, duration=duration, disposal=disposal, **transparency))
+
+    # A frame is written once the next one is known, so repeats can extend it.
+    # Its key is None for the base, else the offset and RGB of its patch.
+    # getdata() sets attributes on the image it writes, so the shared base is copied.
+    pending, pending_key = [base_p.copy(), (0, 0), base_duration, DISPOSE_NONE], None
+    base_index = np.asarray(base_p)
+    for frame, duration in frames:
+        bbox = changed_bbox(base, frame)
+        x1, y1, x2, y2 = bbox or (0, 0, 1, 1)
+        patch_rgb = frame[y1:y2, x1:x2]
+        if bbox is None: same = pending_key is None
+        else: same = pending_key is not None and pending_key[0] == (x1, y1) and np.array_equal(pending_key[1], patch_rgb)
+        if same:
+            pending[2] += duration
+            continue
+        write(*pending)
+        patch = quantize(patch_rgb, palette)
+        index = np.asarray(patch)
+        patch.frombytes(np.where(index == base_index[y1:y2, x1:x2], TRANSPARENT, index).astype(np.uint8).tobytes())
+        pending = [patch, (x1, y1), duration, DISPOSE_PREVIOUS]
+        pending_key = bbox and ((x1, y1), patch_rgb.copy())
+    write(*pending)
+    out.write(b";")
+    return out.getvalue()
+
+
+# --- OUTPUT FORMATS ---
+# GIF is always available and is the fallback. Animated WebP (and AVIF, when
+# Pillow is built with it) are lossy and much smaller; their quality steps
+# down until the encoded animation fits `max_bytes`.
+MIME_TYPES = {"gif": "image/gif", "webp": "image/webp", "avif": "image/avif"}
+AUTO_ORDER = ("webp", "gif")  # AVIF compresses best but encodes ~3x slower, so it is opt-in
+MIN_QUALITY, QUALITY_STEP = 30, 15
+
+
+class AnimationFormat(NamedTuple):
+    name: str = "gif"
+    quality: int = 75
+    max_bytes: int = 0  # 0 means no size target
+
+    @property
+    def mime(self): return MIME_TYPES[self.name]
+
+    @classmethod
+    def of(cls, name, quality=75, max_bytes=0):
+        """Settings for `name`; GIF is lossless, so quality and size targets do not apply."""
+        return cls(name) if name == "gif" else cls(name, quality, max_bytes)
+
+
+def server_formats():
+    """Output formats this Pillow build can encode, best first."""
+    found = [f for f in ("avif", "webp") if features.check(f)]
+    return found + ["gif"]
+
+
+def negotiate_format(requested, client_formats, quality=75, max_bytes=0):
+    """Pick an AnimationFormat for one player.
+
+    `requested` is a format name or "auto"; `client_formats` is what the
+    browser reported it can decode, or None while that is still unknown.
+    A format the server or client cannot handle falls back to WebP, then GIF.
+    """
+    usable = [f for f in server_formats() if f == "gif" or f in (client_formats or ())]
+    wanted = AUTO_ORDER if requested == "auto" else (requested, *AUTO_ORDER)
+    name = next((f for f in wanted if f in usable), "gif")
+    return AnimationFormat.of(name, quality, max_bytes)
+
+
+@functools.lru_cache(maxsize=1)
+def probe_images():
+    """{format: data URI} of a tiny two-frame animation per lossy format, for browser sniffing."""
+    probes = {}
+    for name in server_formats()[:-1]:
+        frames = [Image.new("RGB", (2, 2), c) for c in ("black", "white")]
+        out = io.BytesIO()
+        frames[0].save(out, format=name.upper(), save_all=True, append_images=frames[1:], duration=100, loop=0)
+        probes[name] = f"data:{MIME_TYPES[name]};base64," + base64.b64encode(out.getvalue()).decode()
+    return probes
+
+
+class StreamedAnimation(Image.Image):
+    """Multi-frame RGB image whose frames are pulled from an iterator on seek().
+
+    Pillow's animated WebP/AVIF writers seek through a multi-frame image one
+    frame at a time and encode each as they go, so handing them this instead
+    of a list of frames keeps only the current frame in memory. Frames can
+    only be visited in order (seeking back to frame 0 is allowed).
+    """
+
+    def __init__(self, first, frames, n_frames):
+        super().__init__()
+        self._mode, self._size = "RGB", (first.shape[1], first.shape[0])
+        self.n_frames, self.is_animated = n_frames, n_frames > 1
+        self._first, self._frames, self._index = first, frames, 0
+        self._show(first)
+
+    def _show(self, array):
+        self.im = Image.fromarray(array).im
+
+    def tell(self): return self._index
+
+    def seek(self, frame):
+        if frame == self._index: return
+        if frame == 0:
+            self._show(self._first)
+        elif frame == self._index + 1 and frame < self.n_frames:
+            self._show(next(self._frames))
+        else:
+            raise EOFError(frame)
+        self._index = frame
+
+
+def encode_pillow_animation(out_format, base, base_duration, frames, count, frame_duration):
+    """Encode `base` then `count` frames as animated WebP or AVIF.
+
+    `frames()` returns a fresh iterator of RGB arrays, consumed one at a time;
+    it is called again for every quality step needed to reach max_bytes.
+    """
+    options = {"webp": {"method": 2}, "avif": {"speed": 8}}[out_format.name]
+    durations = [base_duration] + [frame_duration] * count
+    quality = out_format.quality
+    while True:
+        out = io.BytesIO()
+        StreamedAnimation(base, frames(), count + 1).save(out, format=out_format.name.upper(), save_all=True,
+                                                           duration=durations, loop=0, quality=quality, **options)
+        if not out_format.max_bytes or out.tell() <= out_format.max_bytes or quality <= MIN_QUALITY:
+            return out.getvalue()
+        quality = max(MIN_QUALITY, quality - QUALITY_STEP)
@@ -0,0 +1,80 @@
+import hashlib
+import hmac
+import io
+import os
+import secrets
+
+import streamlit as st
+import streamlit.components.v1 as components
+from PIL import Image
+
+import metrics
+from render_cache import file_digest
+from renderer import BASE_HOLD_MS, GLITCH_FRAME_MS, GLITCH_FRAMES, load_level_base, scale_boxes
+from static_assets import publish_bytes
+
+# --- CLIENT-RENDERED BOARD ---
+# The browser draws the level and its glitch animation from the layout's seed
+# (components/glitch_board/glitch.js ports renderer.py, shard for shard), and
+# hit-tests clicks itself for instant feedback. All the server ships per
+# layout is a few numbers; per click it checks a token and a point in a box.
+#
+# Every layout gets a token: an HMAC over the session, level, seed and move
+# number under a per-process secret. A click is [token, x, y]; it only counts
+# if its token is the one for the layout currently in play, so stale, replayed
+# or forged clicks are ignored without any per-click server state.
+_component = components.declare_component(
+    "glitch_board", path=os.path.join(os.path.dirname(os.path.abspath(__file__)), "components", "glitch_board"))
+
+BOARD_SECRET = os.environ.get("BOARD_SECRET", "").encode() or secrets.token_bytes(32)
+TOKEN_BYTES = 12
+
+# Keyed by the asset's digest, so an edited level is published again; `_misses` records a miss for metrics
+@st.cache_resource(show_spinner=False)
+def _publish_level_base(digest, img_path, target_width, _misses):
+    _misses.append(digest)
+    base, _, _ = load_level_base(img_path, target_width)
+    out = io.BytesIO()
+    Image.fromarray(base).save(out, format="PNG")
+    stem = os.path.splitext(os.path.basename(img_path))[0]
+    return publish_bytes(f"{stem}-{target_width}", "png", out.getvalue())
+
+
+def level_base_url(img_path, target_width):
+    """Static URL of the level resized exactly as the server renderer sees it, so both draw identical pixels."""
+    misses = []
+    url = _publish_level_base(file_digest(img_path), img_path, target_width, misses)
+    metrics.cache_lookup("level_base", not misses)
+    return url
+
+
+def layout_token(session, level, seed, move):
+    message = f"{session}:{level}:{seed}:{move}".encode()
+    return hmac.new(BOARD_SECRET, message, hashlib.sha256).hexdigest()[:TOKEN_BYTES * 2]
+
+
+def read_click(value, token, width, height):
+    """{"x", "y"} of a click made on the layout with `token`, or None for no, stale or malformed clicks."""
+    try:
+        click_token, x, y = value
+        x, y = int(x), int(y)
+    except (TypeError, ValueError): return None
+    if not isinstance(click_token, str) or not hmac.compare_digest(click_token, token): return None
+    if not (0 <= x <= width and 0 <= y <= height): return None
+    return {"x": x, "y": y}
+
+
+def glitch_board(img_path, real_boxes, fake_boxes, target_width, seed, token, tolerance, key="glitch-board"):
+    """Render the board for one layout and return (click, scaled_real, scaled_fake).
+
+    Boxes are in level-image pixels, as make_layout returns them; the click and
+    scaled boxes are in board pixels at `target_width`. Keep `key` fixed so the
+    board's frame, and the level image it loaded, persist between layouts.
+    """
+    base, sf_width, sf_height = load_level_base(img_path, target_width)
+    height = base.shape[0]
+    scaled_real, scaled_fake = scale_boxes(real_boxes, sf_width, sf_height), scale_boxes(fake_boxes, sf_width, sf_height)
+    value = _component(image=level_base_url(img_path, target_width), width=target_width, height=height, seed=seed,
+                       real=scaled_real, fake=scaled_fake, tolerance=tolerance, token=token,
+                       hold_ms=BASE_HOLD_MS, frames=GLITCH_FRAMES, frame_ms=GLITCH_FRAME_MS, key=key, default=None)
+    return read_click(value, token, target_width, height), scaled_real, scaled_fake
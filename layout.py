@@ -0,0 +1,105 @@
+import functools
+import random
+from typing import NamedTuple
+
+from PIL import Image
+
+# --- SMART GLITCH GENERATION ---
+# A layout is fully determined by (level, seed), so it can be built ahead of
+# time on any thread, or offline, and reproduced later from the seed alone.
+# Boxes are (x1, y1, x2, y2) in the level image's own pixels.
+
+LEVEL_FILES = ["assets/level1.png", "assets/level2.png", "assets/level3.png"]
+LAYOUT_VERSION = 2  # bump when the same (level, seed) starts producing different boxes
+
+
+class LevelSpec(NamedTuple):
+    real: int  # targets on screen at once
+    decoys: int  # placed best-effort; a crowded image gets fewer
+    real_size: tuple  # (min, max) side in image pixels
+    fake_size: tuple
+    gap: int = 20  # minimum free space between any two boxes
+    margin: int = 50  # minimum distance from the image edge
+
+LEVELS = [
+    LevelSpec(real=1, decoys=1, real_size=(50, 150), fake_size=(70, 180)),
+    LevelSpec(real=1, decoys=2, real_size=(40, 130), fake_size=(65, 165)),
+    LevelSpec(real=2, decoys=3, real_size=(30, 110), fake_size=(60, 150)),
+]
+
+ATTEMPTS = 30  # random tries per box before falling back to a lattice scan
+
+def get_num_real_targets(level_idx): return LEVELS[level_idx].real
+
+@functools.lru_cache(maxsize=None)
+def level_size(level):
+    """(width, height) of a level's image; only the header is read."""
+    with Image.open(LEVEL_FILES[level]) as img: return img.size
+
+
+class _Grid:
+    """Spatial hash of placed boxes. Cells are at least as wide as the largest
+    box plus the gap, so a new box can only collide with boxes whose corner
+    lies in its own or one of the eight neighbouring cells."""
+
+    def __init__(self, cell, gap):
+        self.cell, self.gap = cell, gap
+        self.cells = {}
+
+    def free(self, box):
+        x1, y1, x2, y2 = box
+        cx, cy = x1 // self.cell, y1 // self.cell
+        for gx in (cx - 1, cx, cx + 1):
+            for gy in (cy - 1, cy, cy + 1):
+                for bx1, by1, bx2, by2 in self.cells.get((gx, gy), ()):
+                    if not (x2 + self.gap < bx1 or bx2 + self.gap < x1 or y2 + self.gap < by1 or by2 + self.gap < y1): return False
+        return True
+
+    def add(self, box):
+        self.cells.setdefault((box[0] // self.cell, box[1] // self.cell), []).append(box)
+
+
+def _place(rng, grid, bounds, size_range, margin):
+    """Place one box of random size in `bounds`, or return None. Always terminates:
+    ATTEMPTS random positions, then every lattice point in random order, then
+    the same again at the smallest allowed size."""
+    width, height = bounds
+    lo, hi = size_range
+    sizes = [(rng.randint(lo, hi), rng.randint(lo, hi)), (lo, lo)]
+    for w, h in sizes:
+        x_max, y_max = width - margin - w, height - margin - h
+        if x_max < margin or y_max < margin: continue
+        for _ in range(ATTEMPTS):
+            x, y = rng.randint(margin, x_max), rng.randint(margin, y_max)
+            if grid.free((x, y, x + w, y + h)): return (x, y, x + w, y + h)
+        step = max(1, min(w, h) // 2)
+        lattice = [(x, y) for x in range(margin, x_max + 1, step) for y in range(margin, y_max + 1, step)]
+        rng.shuffle(lattice)
+        for x, y in lattice:
+            if grid.free((x, y, x + w, y + h)): return (x, y, x + w, y + h)
+    return None
+
+
+def make_layout(level, seed, num_real=None, image_size=None):
+    """Return (real_boxes, fake_boxes) as (x1, y1, x2, y2) tuples for `level` and `seed`.
+
+    `image_size` defaults to the level image's size. Raises ValueError if the
+    level's real targets cannot fit on the image at all.
+    """
+    spec = LEVELS[level]
+    bounds = image_size or level_size(level)
+    rng = random.Random(seed)
+    grid = _Grid(max(spec.real_size[1], spec.fake_size[1]) + spec.gap, spec.gap)
+    real, fake = [], []
+    num_real = spec.real if num_real is None else num_real
+    for _ in range(num_real):
+        box = _place(rng, grid, bounds, spec.real_size, spec.margin)
+        if box is None: raise ValueError(f"Level {level + 1}: no room for {num_real} real targets on a {bounds} image")
+        grid.add(box)
+        real.append(box)
+    for _ in range(spec.decoys):
+        box = _place(rng, grid, bounds, spec.fake_size, spec.margin)
+        if box is None: break
+        grid.add(box)
+        fake.append(box)
+    return real, fake
@@ -0,0 +1,216 @@
+"""Offline pool of pre-rendered glitch layouts.
+
+Build or refresh the pool next to app.py with:
+
+    python layout_pool.py --per-level 500 --jobs 8
+
+Every level gets `--per-level` layouts (boxes, and per render width in
+`--widths` the scaled boxes and the encoded animation, in `--format`; by
+default every tier in config.RENDER_TIERS, in the format config.ANIMATION_*
+negotiates for a current browser). Animations are stored content-addressed
+under `objects/` and indexed by `manifest.json`. Levels whose asset, widths,
+format settings, layout engine or renderer changed since the last build are
+regenerated; unchanged levels are only topped up. At runtime the app picks layouts from
+the pool and serves their animations straight from disk.
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import tempfile
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+import streamlit as st
+
+import config
+from layout import LAYOUT_VERSION, LEVEL_FILES, get_num_real_targets, make_layout
+from encoders import AnimationFormat, negotiate_format, server_formats
+from render_cache import file_digest
+from renderer import RENDER_VERSION, encode_layout
+
+MANIFEST = "manifest.json"
+MANIFEST_VERSION = 2  # 2: one animation per render tier
+
+
+class PooledLayout(NamedTuple):
+    seed: int
+    real_boxes: list
+    fake_boxes: list
+    scaled_real: list
+    scaled_fake: list
+    path: str
+
+
+# --- HELPERS ---
+def _atomic_write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as f: f.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+def _boxes(raw): return [tuple(b) for b in raw]
+
+
+# --- RUNTIME ---
+class LayoutPool:
+    """Read-only view of a built pool, limited to levels whose asset still matches."""
+
+    def __init__(self, root, manifest=None):
+        self.root = root
+        self.levels = {}
+        self._mismatches = set()
+        self._lock = threading.Lock()
+        for level, entry in (manifest or {}).get("levels", {}).items():
+            level = int(level)
+            if level >= len(LEVEL_FILES) or entry["asset"] != LEVEL_FILES[level]: stale = "level asset renamed"
+            elif entry.get("layout_version") != LAYOUT_VERSION: stale = "layout engine changed"
+            elif entry.get("render_version") != RENDER_VERSION: stale = "renderer changed"
+            else:
+                try: stale = file_digest(entry["asset"]) != entry["asset_sha256"] and "level asset edited"
+                except OSError: stale = "level asset missing"
+            if stale:
+                print(f"Layout pool: ignoring level {level + 1} in {root} ({stale}); rebuild it with layout_pool.py")
+                continue
+            out_format = AnimationFormat(*entry["format"])
+            self.levels[level] = ((frozenset(entry["widths"]), out_format), {
+                l["seed"]: {int(width): PooledLayout(l["seed"], _boxes(l["real_boxes"]), _boxes(l["fake_boxes"]),
+                                                     _boxes(t["scaled_real"]), _boxes(t["scaled_fake"]),
+                                                     os.path.join(root, t["object"]))
+                            for width, t in l["tiers"].items()}
+                for l in entry["layouts"]})
+
+    def _matches(self, level, target_width, out_format):
+        """Whether `level` was built for `target_width` in `out_format`; each new mismatch is logged once."""
+        if level not in self.levels: return False
+        widths, built_format = self.levels[level][0]
+        if target_width in widths and built_format == out_format: return True
+        with self._lock:
+            if (level, target_width, out_format) in self._mismatches: return False
+            self._mismatches.add((level, target_width, out_format))
+        print(f"Layout pool: level {level + 1} was built for widths {sorted(widths)} in {built_format}, "
+              f"not {target_width} in {out_format}; rendering those layouts live")
+        return False
+
+    def choose(self, level, target_width, out_format, exclude=None):
+        """A random pooled layout for `level` at `target_width` in `out_format`, or None if the pool has none."""
+        if not self._matches(level, target_width, out_format): return None
+        layouts = self.levels[level][1]
+        seeds = [s for s in layouts if s != exclude]
+        return layouts[random.choice(seeds)][target_width] if seeds else None
+
+    def lookup(self, level, seed, target_width, out_format):
+        """(path, scaled_real, scaled_fake) for a pooled layout, shaped like generate_scaled_gif's result.
+
+        Every seed is built at every width, so a player whose tier changes mid-level still hits the pool.
+        """
+        hit = self.levels[level][1].get(seed, {}).get(target_width) if self._matches(level, target_width, out_format) else None
+        return (hit.path, hit.scaled_real, hit.scaled_fake) if hit else None
+
+
+@st.cache_resource(show_spinner=False, max_entries=4)
+def _load_layout_pool(root, mtime):
+    manifest = None
+    if mtime is not None:
+        path = os.path.join(root, MANIFEST)
+        with open(path) as f: manifest = json.load(f)
+        if manifest.get("version") != MANIFEST_VERSION:
+            print(f"Layout pool: ignoring {path} (manifest version {manifest.get('version')}); rebuild it with layout_pool.py")
+            manifest = None
+    return LayoutPool(root, manifest)
+
+def get_layout_pool(root):
+    """Process-wide LayoutPool for `root`, reloaded whenever the manifest is rewritten."""
+    try: mtime = os.path.getmtime(os.path.join(root, MANIFEST))
+    except OSError: mtime = None
+    return _load_layout_pool(root, mtime)
+
+
+# --- BUILD ---
+def _build_layout(asset, level, seed, widths, out_format):
+    real_boxes, fake_boxes = make_layout(level, seed, get_num_real_targets(level))
+    tiers = {}
+    for width in widths:
+        data, scaled_real, scaled_fake = encode_layout(asset, real_boxes, fake_boxes, width, seed, out_format)
+        tiers[str(width)] = ({"scaled_real": scaled_real, "scaled_fake": scaled_fake}, data)
+    return {"seed": seed, "real_boxes": real_boxes, "fake_boxes": fake_boxes}, tiers
+
+def build_pool(root, per_level, widths=config.RENDER_TIERS, out_format=AnimationFormat(), jobs=1, seed=None):
+    widths = sorted(set(widths))
+    path = os.path.join(root, MANIFEST)
+    manifest = {"version": MANIFEST_VERSION, "levels": {}}
+    if os.path.exists(path):
+        with open(path) as f: old = json.load(f)
+        if old.get("version") == MANIFEST_VERSION: manifest = old
+    rng = random.Random(seed)
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        for level, asset in enumerate(LEVEL_FILES):
+            digest = file_digest(asset)
+            entry = manifest["levels"].get(str(level))
+            built = (entry["asset"], entry["asset_sha256"], entry["widths"], entry["format"],
+                     entry.get("layout_version"), entry.get("render_version")) if entry else None
+            if built != (asset, digest, widths, list(out_format), LAYOUT_VERSION, RENDER_VERSION):
+                print(f"Level {level + 1}: {'asset or settings changed, rebuilding' if entry else 'building'}")
+                entry = {"asset": asset, "asset_sha256": digest, "widths": widths, "format": list(out_format),
+                         "layout_version": LAYOUT_VERSION, "render_version": RENDER_VERSION, "layouts": []}
+            entry["layouts"] = entry["layouts"][:per_level]
+            have = {l["seed"] for l in entry["layouts"]}
+            seeds = [s for s in rng.sample(range(1, 100001), per_level + len(have)) if s not in have]
+            seeds = seeds[:per_level - len(entry["layouts"])]
+
+            futures = [executor.submit(_build_layout, asset, level, s, widths, out_format) for s in seeds]
+            for done, future in enumerate(futures, 1):
+                layout, tiers = future.result()
+                layout["tiers"] = {}
+                for width, (tier, data) in tiers.items():
+                    digest_anim = hashlib.sha256(data).hexdigest()
+                    tier["object"] = f"objects/{digest_anim[:2]}/{digest_anim}.{out_format.name}"
+                    target = os.path.join(root, tier["object"])
+                    if not os.path.exists(target): _atomic_write(target, data)
+                    layout["tiers"][width] = tier
+                entry["layouts"].append(layout)
+                print(f"Level {level + 1}: {done}/{len(futures)}", end="\r")
+            print(f"Level {level + 1}: {len(entry['layouts'])} layouts" + " " * 10)
+            manifest["levels"][str(level)] = entry
+
+    _atomic_write(path, json.dumps(manifest, indent=1).encode())
+
+    # Drop animations no longer referenced by the manifest
+    live = {os.path.join(root, t["object"]) for e in manifest["levels"].values()
+            for l in e["layouts"] for t in l["tiers"].values()}
+    for dirpath, _, files in os.walk(os.path.join(root, "objects"), topdown=False):
+        for name in files:
+            if os.path.join(dirpath, name) not in live: os.unlink(os.path.join(dirpath, name))
+        if not os.listdir(dirpath): os.rmdir(dirpath)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-render the glitch layout pool served by app.py.")
+    parser.add_argument("--out", default="pool", help="pool directory (default: pool)")
+    parser.add_argument("--per-level", type=int, default=200, help="layouts per level (default: 200)")
+    parser.add_argument("--widths", type=int, nargs="+", default=list(config.RENDER_TIERS),
+                        help="render widths, each served to players on that tier (default: every RENDER_TIERS width)")
+    # Layouts are only served to players whose negotiated format matches exactly, so the defaults follow config
+    parser.add_argument("--format", default=config.ANIMATION_FORMAT, choices=["auto", "gif", "webp", "avif"],
+                        help=f"animation format; auto picks what a current browser negotiates (default: {config.ANIMATION_FORMAT})")
+    parser.add_argument("--quality", type=int, default=config.ANIMATION_QUALITY,
+                        help=f"WebP/AVIF quality, must match ANIMATION_QUALITY (default: {config.ANIMATION_QUALITY})")
+    parser.add_argument("--max-bytes", type=int, default=config.ANIMATION_MAX_BYTES,
+                        help=f"WebP/AVIF size target, must match ANIMATION_MAX_BYTES (default: {config.ANIMATION_MAX_BYTES})")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count() or 1, help="render processes (default: all cores)")
+    parser.add_argument("--seed", type=int, default=None, help="seed for picking layout seeds, for reproducible pools")
+    args = parser.parse_args()
+    out_format = negotiate_format(args.format, server_formats(), args.quality, args.max_bytes)
+    print(f"Building for {out_format}")
+    build_pool(args.out, args.per_level, args.widths, out_format, args.jobs, args.seed)
+
+
+if __name__ == "__main__":
+    main()
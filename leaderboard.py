@@ -0,0 +1,96 @@
+import bisect
+import heapq
+import itertools
+import threading
+import time
+from typing import NamedTuple
+
+import streamlit as st
+
+import metrics
+
+# --- LEADERBOARD CACHE ---
+# The menu reruns on every keystroke, so the leaderboard must not read the
+# score sheet each time. One process-wide top-K is shared by every session:
+# it is fully reloaded at most once per TTL, and scores saved by this process
+# are inserted in place as soon as the write succeeds. Alongside the top-K it
+# keeps every time in sorted order and each USN's best, so a player's rank is
+# a binary search.
+
+
+class Score(NamedTuple):
+    time: float
+    order: int  # ties keep submission order, like the stable sort of the sheet
+    name: str
+    usn: str
+
+
+class PlayerRank(NamedTuple):
+    rank: int  # 1 + number of scores strictly faster than the player's best
+    time: float
+
+
+class Leaderboard:
+    def __init__(self, ttl=60, size=10):
+        self.ttl = ttl
+        self.size = size
+        self.reloads = 0
+        self._scores = None  # None until the first successful load
+        self._times, self._best = [], {}
+        self._expires = 0.0
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+
+    def top(self, loader):
+        """Best `size` scores, fastest first, reloading through `loader` once the TTL has expired.
+
+        `loader()` returns every (name, usn, time) row of the store and may raise.
+        While one session reloads, the others keep getting the previous ranking.
+        """
+        stale = time.monotonic() >= self._expires
+        metrics.cache_lookup("leaderboard", not stale)
+        if stale and self._reload_lock.acquire(blocking=self._scores is None):
+            try:
+                if time.monotonic() >= self._expires: self._reload(loader)
+            finally: self._reload_lock.release()
+        with self._lock: return list(self._scores or ())
+
+    def add(self, name, usn, time_val):
+        """Rank a score that was just saved, without waiting for the next reload."""
+        with self._lock:
+            if self._scores is None: return
+            bisect.insort(self._times, time_val)
+            if time_val < self._best.get(usn, float("inf")): self._best[usn] = time_val
+            score = Score(time_val, next(self._order), name, usn)
+            if len(self._scores) >= self.size and score >= self._scores[-1]: return
+            bisect.insort(self._scores, score)
+            del self._scores[self.size:]
+
+    def rank(self, usn):
+        """PlayerRank of `usn`'s best score as of the last reload plus later adds, or None."""
+        with self._lock:
+            best = self._best.get(usn)
+            return PlayerRank(bisect.bisect_left(self._times, best) + 1, best) if best is not None else None
+
+    def _reload(self, loader):
+        try: rows = loader()
+        except Exception as e:
+            print(f"Leaderboard reload error: {e}")
+            rows = None
+        with self._lock:
+            self._expires = time.monotonic() + self.ttl  # failures also wait a full TTL, so reads stay flat
+            if rows is None: return
+            self._order = itertools.count()
+            self._scores = heapq.nsmallest(self.size, (Score(t, next(self._order), n, u) for n, u, t in rows))
+            self._times = sorted(t for _, _, t in rows)
+            self._best = {}
+            for _, usn, t in rows:
+                if t < self._best.get(usn, float("inf")): self._best[usn] = t
+            self.reloads += 1
+
+
+@st.cache_resource(show_spinner=False)
+def get_leaderboard_cache(name, ttl, size):
+    """Process-wide Leaderboard for the sheet `name`, reloaded every `ttl` seconds and keeping the top `size`."""
+    return Leaderboard(ttl, size)
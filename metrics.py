@@ -0,0 +1,193 @@
+import bisect
+import functools
+import json
+import os
+import threading
+import time
+import weakref
+
+# --- METRICS ---
+# Opt-in profiling of reruns. With METRICS=1 the instrumented sections of
+# app.py (spans), the payloads they emit and the lookups of every cache are
+# aggregated process-wide into histograms and counters, exposed in Prometheus
+# text format (served at /metrics by asgi.py). METRICS_LOG=1 also prints one
+# JSON line per rerun with its own spans and lookups. When both are off,
+# timed() returns the function untouched and every other call returns at
+# its first line, so production pays nothing for the hooks.
+
+LOG_RERUNS = os.environ.get("METRICS_LOG", "0") not in ("", "0")
+ENABLED = LOG_RERUNS or os.environ.get("METRICS", "0") not in ("", "0")
+
+PREFIX = "detroit_"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+METRICS = {  # name: (type, help, buckets)
+    "rerun_seconds": ("histogram", "Wall time of one script run, from session init to the end of the script.", LATENCY_BUCKETS),
+    "span_seconds": ("histogram", "Time spent in an instrumented section of a rerun.", LATENCY_BUCKETS),
+    "payload_bytes": ("histogram", "Bytes an instrumented section emitted or produced.", SIZE_BUCKETS),
+    "cache_lookups_total": ("counter", "Cache lookups by cache and result.", None),
+}
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last slot is +Inf
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+_series = {}  # (metric, ((label, value), ...)) -> Histogram or counter value
+_lock = threading.Lock()
+_local = threading.local()
+
+
+def _observe(metric, value, **labels):
+    key = (metric, tuple(sorted(labels.items())))
+    with _lock:
+        if METRICS[metric][0] == "counter": _series[key] = _series.get(key, 0) + value
+        else:
+            if key not in _series: _series[key] = Histogram(METRICS[metric][2])
+            _series[key].observe(value)
+
+
+def _current():
+    """This thread's rerun record, or None outside a script run."""
+    rerun = getattr(_local, "rerun", None)
+    return rerun and rerun.record
+
+
+# --- RERUNS ---
+class _Rerun:
+    """Holds a rerun's record; when the script thread ends, its thread-locals are
+    dropped and the finalizer closes the rerun."""
+
+    __slots__ = ("record", "close", "__weakref__")
+
+    def __init__(self, fields):
+        self.record = {"start": time.perf_counter(), "fields": fields, "spans": {}, "cache": {}}
+        self.close = weakref.finalize(self, _finish, self.record)
+
+
+def _finish(record):
+    seconds = time.perf_counter() - record["start"]
+    _observe("rerun_seconds", seconds)
+    if LOG_RERUNS:
+        print(json.dumps({"event": "rerun", **record["fields"], "seconds": round(seconds, 6),
+                          "spans": record["spans"], "cache": record["cache"]}, default=str), flush=True)
+
+
+def begin_rerun(**fields):
+    """Start recording a script run; `fields` are added to its log line.
+
+    st.rerun() re-executes the script on the same thread, so a run still open
+    on this thread is closed first.
+    """
+    if not ENABLED: return
+    previous = getattr(_local, "rerun", None)
+    if previous: previous.close()
+    _local.rerun = _Rerun(fields)
+
+
+# --- INSTRUMENTATION ---
+def _record_span(name, seconds=0.0, nbytes=None):
+    record = _current()
+    if record is None: return
+    span = record["spans"].setdefault(name, {"calls": 0, "seconds": 0.0})
+    if nbytes is None:
+        span["calls"] += 1
+        span["seconds"] = round(span["seconds"] + seconds, 6)
+    else:
+        span["bytes"] = span.get("bytes", 0) + nbytes
+
+
+def timed(name):
+    """Decorator recording each call's duration as span `name`; a no-op when metrics are off."""
+    def wrap(fn):
+        if not ENABLED: return fn
+
+        @functools.wraps(fn)
+        def timed_fn(*args, **kwargs):
+            start = time.perf_counter()
+            try: return fn(*args, **kwargs)
+            finally:
+                seconds = time.perf_counter() - start
+                _observe("span_seconds", seconds, span=name)
+                _record_span(name, seconds)
+        return timed_fn
+    return wrap
+
+
+class _Span:
+    def __init__(self, name): self.name = name
+
+    def __enter__(self): self.start = time.perf_counter()
+
+    def __exit__(self, *exc):
+        seconds = time.perf_counter() - self.start
+        _observe("span_seconds", seconds, span=self.name)
+        _record_span(self.name, seconds)
+
+
+class _NoSpan:
+    def __enter__(self): pass
+    def __exit__(self, *exc): pass
+
+_NO_SPAN = _NoSpan()
+
+
+def span(name):
+    """Context manager timing a block as span `name`."""
+    return _Span(name) if ENABLED else _NO_SPAN
+
+
+def payload(name, nbytes):
+    """Record `nbytes` emitted or produced by span `name`."""
+    if not ENABLED: return
+    _observe("payload_bytes", nbytes, span=name)
+    _record_span(name, nbytes=nbytes)
+
+
+def cache_lookup(cache, hit):
+    """Count one lookup in `cache`."""
+    if not ENABLED: return
+    result = "hit" if hit else "miss"
+    _observe("cache_lookups_total", 1, cache=cache, result=result)
+    record = _current()
+    if record is not None:
+        key = f"{cache}:{result}"
+        record["cache"][key] = record["cache"].get(key, 0) + 1
+
+
+# --- EXPOSITION ---
+def _escape(value): return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(pairs):
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}" if pairs else ""
+
+def render():
+    """Every series in Prometheus text exposition format."""
+    with _lock:
+        series = sorted((key, value if isinstance(value, (int, float)) else (list(value.counts), value.sum))
+                        for key, value in _series.items())
+    lines = []
+    for metric, (kind, help_text, buckets) in METRICS.items():
+        name = PREFIX + metric
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+        for (series_metric, labels), value in series:
+            if series_metric != metric: continue
+            if kind == "counter":
+                lines.append(f"{name}{_labels(labels)} {value}")
+                continue
+            counts, total = value
+            cumulative = 0
+            for le, count in zip([*map(str, buckets), "+Inf"], counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+            lines += [f"{name}_sum{_labels(labels)} {total}", f"{name}_count{_labels(labels)} {cumulative}"]
+    return "\n".join(lines) + "\n"
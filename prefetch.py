@@ -0,0 +1,84 @@
+import os
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple
+
+from layout import make_layout
+from renderer import render_layout
+
+# --- LAYOUT PREFETCH ---
+# While a player is aiming, the next few layouts for their level are rendered
+# on a small process-wide pool, so a click only has to pop a finished one.
+PREFETCH_WORKERS = max(1, min(4, (os.cpu_count() or 1) - 1))
+_executor = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix="glitch-prefetch")
+
+
+class PrefetchedLayout(NamedTuple):
+    level: int
+    seed: int
+    real_boxes: list
+    fake_boxes: list
+    render: object  # Future resolving to render_layout's result, or None on failure
+
+
+def _render(cache, img_path, real_boxes, fake_boxes, target_width, seed, out_format):
+    try: return render_layout(cache, img_path, real_boxes, fake_boxes, target_width, seed, out_format)
+    except Exception as e:
+        print(f"Prefetch render error: {e}")
+        return None
+
+
+def wait_for_render(render):
+    """Result of a prefetched render, or None if it is better to render synchronously.
+
+    Work that is still waiting for a pool thread is cancelled rather than
+    waited on, so a busy pool never makes a player slower than a direct render.
+    A finished render is checked again on every use: other sessions' writes may
+    have evicted it from the render cache since.
+    """
+    if render is None or (not render.running() and render.cancel()): return None
+    result = render.result()
+    if result is None: return None
+    try: os.utime(result[0])  # still cached; mark it recently used, as RenderCache.get does
+    except FileNotFoundError: return None
+    return result
+
+
+class LayoutPrefetcher:
+    """Per-session queue of upcoming layouts for the level being played."""
+
+    def __init__(self, cache, depth=3):
+        self.cache = cache
+        self.depth = depth
+        self.level = self.out_format = None
+        self._queue = deque()
+        self._lock = threading.Lock()
+
+    def fill(self, level, img_path, num_real, target_width, out_format):
+        """Top the queue up to `depth` layouts for `level`, dropping work queued for any other level or format."""
+        with self._lock:
+            if (level, out_format) != (self.level, self.out_format):
+                self._drop()
+                self.level, self.out_format = level, out_format
+            while len(self._queue) < self.depth:
+                seed = random.randint(1, 100000)
+                real_boxes, fake_boxes = make_layout(level, seed, num_real)
+                render = _executor.submit(_render, self.cache, img_path, real_boxes, fake_boxes, target_width, seed, out_format)
+                self._queue.append(PrefetchedLayout(level, seed, real_boxes, fake_boxes, render))
+
+    def pop(self, level, out_format):
+        """Next queued layout for `level` in `out_format`, or None when the caller must build one itself."""
+        with self._lock:
+            if (level, out_format) != (self.level, self.out_format) or not self._queue: return None
+            return self._queue.popleft()
+
+    def cancel(self):
+        with self._lock:
+            self._drop()
+            self.level = self.out_format = None
+
+    def _drop(self):
+        for item in self._queue: item.render.cancel()
+        self._queue.clear()
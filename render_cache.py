@@ -0,0 +1,123 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+import streamlit as st
+
+import metrics
+
+try: import fcntl
+except ImportError: fcntl = None  # no cross-process locking (Windows); eviction still works per process
+
+# --- RENDER CACHE ---
+# Rendered layouts live in one directory shared by every Streamlit worker
+# process on the host. Entries are content-addressed by a hash of everything
+# that determines the output, written atomically (temp file + rename), and
+# evicted least-recently-used first once the directory exceeds its byte
+# budget. A hit bumps the file's mtime, which is the LRU clock every process
+# sees; eviction passes hold an flock so two processes never race on deletes.
+
+LOW_WATERMARK = 0.8  # evict down to this fraction of the budget
+RESCAN_EVERY = 64  # re-measure the directory after this many local writes, to see other processes' writes
+
+_digests = {}
+
+def file_digest(path):
+    """sha256 of a file, memoised on (path, mtime, size) so repeat checks stay cheap."""
+    info = os.stat(path)
+    key = (os.path.abspath(path), info.st_mtime, info.st_size)
+    if key not in _digests:
+        with open(path, "rb") as f: _digests[key] = hashlib.sha256(f.read()).hexdigest()
+    return _digests[key]
+
+def cache_key(*parts):
+    """Stable content address for JSON-serialisable render inputs."""
+    return hashlib.sha256(json.dumps(parts, separators=(",", ":")).encode()).hexdigest()
+
+
+class RenderCache:
+    def __init__(self, root, max_bytes):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = self.misses = self.evictions = 0
+        self._lock = threading.Lock()
+        self._approx_bytes = None
+        self._writes = 0
+        os.makedirs(root, exist_ok=True)
+
+    def path_for(self, key, ext):
+        return os.path.join(self.root, key[:2], f"{key}.{ext}")
+
+    def get(self, key, ext):
+        """Path of a cached entry, or None. A hit marks the entry as recently used."""
+        path = self.path_for(key, ext)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock: self.misses += 1
+            metrics.cache_lookup("render", False)
+            return None
+        with self._lock: self.hits += 1
+        metrics.cache_lookup("render", True)
+        return path
+
+    def put(self, key, ext, data):
+        """Store `data` atomically under `key` and return its path."""
+        path = self.path_for(key, ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f: f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        with self._lock:
+            self._writes += 1
+            rescan = self._approx_bytes is None or self._writes % RESCAN_EVERY == 0
+            if not rescan: self._approx_bytes += len(data)
+            over = rescan or self._approx_bytes > self.max_bytes
+        if over: self._evict()
+        return path
+
+    def _entries(self):
+        for sub in os.scandir(self.root):
+            if not sub.is_dir(): continue
+            for entry in os.scandir(sub.path):
+                if entry.name.startswith(".tmp-"): continue
+                try: info = entry.stat()
+                except FileNotFoundError: continue
+                yield info.st_mtime, info.st_size, entry.path
+
+    def _evict(self):
+        with open(os.path.join(self.root, ".lock"), "a") as lock:
+            if fcntl: fcntl.flock(lock, fcntl.LOCK_EX)
+            entries = sorted(self._entries())
+            total = sum(size for _, size, _ in entries)
+            evicted = 0
+            if total > self.max_bytes:
+                for _, size, path in entries:
+                    if total <= self.max_bytes * LOW_WATERMARK: break
+                    try: os.unlink(path)
+                    except FileNotFoundError: pass
+                    total -= size
+                    evicted += 1
+        with self._lock:
+            self._approx_bytes = total
+            self.evictions += evicted
+        if evicted: print(f"Render cache: evicted {evicted} entries, {self.stats()}")
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses, "evictions": self.evictions,
+                    "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                    "approx_bytes": self._approx_bytes, "max_bytes": self.max_bytes}
+
+
+@st.cache_resource(show_spinner=False)
+def get_render_cache(root, max_bytes):
+    """Process-wide RenderCache for `root` with a budget of `max_bytes`."""
+    return RenderCache(root, max_bytes)
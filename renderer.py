@@ -0,0 +1,211 @@
+import os
+import random
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PIL import Image
+
+from encoders import AnimationFormat, build_palette, encode_delta_gif, encode_pillow_animation, quantize
+from render_cache import cache_key, file_digest
+
+# --- LEVEL BASES ---
+# Decoding and LANCZOS-resizing a level is identical for every player and
+# seed, so it happens once per server process and is shared by all sessions.
+# The level's GIF palette is derived from the same base and cached alongside.
+_level_bases = {}
+_level_palettes = {}
+_level_bases_lock = threading.Lock()
+
+
+def _level_key(img_path, target_width):
+    path = os.path.abspath(img_path)
+    key = (path, os.path.getmtime(path), target_width)
+    if key not in _level_bases:
+        for cache in (_level_bases, _level_palettes):
+            for stale in [k for k in cache if k[0] == path and k[2] == target_width]:
+                del cache[stale]
+    return key
+
+
+def load_level_base(img_path, target_width):
+    """Return (frame, sf_width, sf_height) for a level resized to target_width x 16:9.
+
+    The frame is a read-only array shared across threads; copy it before drawing.
+    Entries are keyed by (path, mtime, width) so an edited asset is picked up.
+    """
+    with _level_bases_lock:
+        key = _level_key(img_path, target_width)
+        if key not in _level_bases:
+            with Image.open(key[0]) as img:
+                img = img.convert("RGB")
+                target_height = int(target_width * (9 / 16))
+                frame = np.asarray(img.resize((target_width, target_height), Image.Resampling.LANCZOS))
+            frame.flags.writeable = False
+            _level_bases[key] = (frame, target_width / img.width, target_height / img.height)
+        return _level_bases[key]
+
+
+def load_level_palette(img_path, target_width):
+    """Return (palette, base_p): the level's shared GIF palette and its base frame quantized to it."""
+    base, _, _ = load_level_base(img_path, target_width)
+    with _level_bases_lock:
+        key = _level_key(img_path, target_width)
+        if key not in _level_palettes:
+            palette = build_palette(base)
+            _level_palettes[key] = (palette, quantize(base, palette))
+        return _level_palettes[key]
+
+
+# --- GLITCH SHARD RENDERER ---
+# Frames are HxWx3 uint8 arrays. Every shard is an in-place slice operation on
+# the frame array, replaying the draws the old PIL crop/invert/enhance/paste
+# path made so a given seed still produces the same animation.
+
+# ITU-R 601-2 luma weights, in the 16.16 fixed point PIL uses for convert("L")
+LUMA_WEIGHTS = np.array([19595, 38470, 7471], dtype=np.int32)
+REAL_CONTRAST, FAKE_CONTRAST = 3, 1
+
+
+def shard_mean(shard, w_shard, h_shard):
+    """Mean grey level of an inverted shard, rounded like ImageEnhance.Contrast.
+
+    `shard` may be smaller than w_shard x h_shard when the crop ran past the
+    frame edge; PIL pads those pixels with black, which invert to pure white.
+    """
+    luma = (shard.astype(np.int32) @ LUMA_WEIGHTS + 0x8000) >> 16
+    padding = w_shard * h_shard - luma.size
+    return int((int(luma.sum()) + 255 * padding) / (w_shard * h_shard) + 0.5)
+
+
+def mutate_frame(frame, boxes, rng, is_fake=False):
+    """Invert and contrast-boost 4-9 random shards around each box of `frame`, in place."""
+    height, width = frame.shape[:2]
+    contrast = FAKE_CONTRAST if is_fake else REAL_CONTRAST
+    for x1, y1, x2, y2 in boxes:
+        cx, cy = (x1 + x2) // 2, (y1 + y2) // 2
+        for _ in range(rng.randint(4, 9)):
+            w_shard, h_shard = rng.randint(30, 200), rng.randint(20, 150)
+            sx = max(0, min(cx - w_shard // 2 + rng.randint(-60, 60), width - w_shard))
+            sy = max(0, min(cy - h_shard // 2 + rng.randint(-60, 60), height - h_shard))
+            shard = frame[sy:sy+h_shard, sx:sx+w_shard]
+            np.subtract(255, shard, out=shard)
+            if contrast != 1:
+                # Image.blend(grey, shard, c) == grey + c*(shard-grey), exact in integers
+                offset = (contrast - 1) * shard_mean(shard, w_shard, h_shard)
+                np.clip(shard.astype(np.int16) * contrast - offset, 0, 255, out=shard, casting="unsafe")
+    return frame
+
+
+# --- FRAME SYNTHESIS ---
+# Each glitched frame draws from its own generator, seeded from the layout's
+# seed and the frame index, so frames are independent: they can be rendered
+# in any order, on any thread, and still reproduce exactly (glitch.js derives
+# the same sub-seeds). NumPy releases the GIL for the shard operations, so a
+# thread pool spreads renders over several cores. Each render keeps at most
+# FRAMES_IN_FLIGHT frames on the pool: the pool is shared by the script,
+# prefetch and warm-up threads, so one buffer per worker per render would
+# multiply with concurrency without adding throughput.
+# glitch.js mirrors these seeds and the shard maths; check_glitch_parity.py verifies they still agree
+FRAME_SEED_STRIDE = 1000  # more than any frame count, so sub-seeds of different layouts never collide
+RENDER_WORKERS = int(os.environ.get("RENDER_WORKERS", 0)) or min(8, os.cpu_count() or 1)  # 1 renders serially
+FRAMES_IN_FLIGHT = 2  # frames one render has queued on the pool while the encoder consumes the previous one
+
+_frame_pool = None
+_frame_pool_lock = threading.Lock()
+
+def _get_frame_pool():
+    """Process-wide frame pool, or None to render serially. Created on first use, so forked workers get their own."""
+    global _frame_pool
+    if RENDER_WORKERS <= 1: return None
+    with _frame_pool_lock:
+        if _frame_pool is None or _frame_pool[0] != os.getpid():
+            _frame_pool = (os.getpid(), ThreadPoolExecutor(RENDER_WORKERS, thread_name_prefix="glitch-frames"))
+        return _frame_pool[1]
+
+
+def frame_seed(glitch_seed, index): return glitch_seed * FRAME_SEED_STRIDE + index
+
+
+def render_glitch_frame(base, scaled_real, scaled_fake, seed, out=None):
+    """One glitched copy of the `base` array, real shards first, then decoys, drawn into `out` if given."""
+    rng = random.Random(seed)
+    frame = base.copy() if out is None else out
+    if out is not None: np.copyto(out, base)
+    mutate_frame(frame, scaled_real, rng, False)
+    mutate_frame(frame, scaled_fake, rng, True)
+    return frame
+
+
+def render_glitch_frames(base, scaled_real, scaled_fake, glitch_seed, count=8):
+    """Yield the `count` glitched frames of a layout in order, rendered on the frame pool when there is one.
+
+    Frames are drawn into a few reused working buffers, so a yielded array is
+    only valid until the next one is requested; copy it to keep it. Serially
+    that is a single buffer; with the pool, FRAMES_IN_FLIGHT plus one.
+    """
+    seeds = iter([frame_seed(glitch_seed, i) for i in range(count)])
+    pool = _get_frame_pool()
+    if pool is None:
+        buffer = np.empty_like(base)
+        for seed in seeds: yield render_glitch_frame(base, scaled_real, scaled_fake, seed, buffer)
+        return
+
+    free = [np.empty_like(base) for _ in range(min(FRAMES_IN_FLIGHT, count) + 1)]
+    pending = deque()
+    def submit():
+        seed = next(seeds, None)
+        if seed is not None: pending.append(pool.submit(render_glitch_frame, base, scaled_real, scaled_fake, seed, free.pop()))
+    for _ in range(len(free) - 1): submit()
+    while pending:
+        frame = pending.popleft().result()
+        submit()
+        yield frame
+        free.append(frame)
+
+
+# --- ANIMATION ---
+# The base is held for 15 x 200 ms (formerly 15 identical frames), then 8
+# glitched frames play at 70 ms each.
+BASE_HOLD_MS, GLITCH_FRAMES, GLITCH_FRAME_MS = 15 * 200, 8, 70
+# Bump whenever rendered output changes, so cached renders are not reused; if the frames
+# changed, mirror it in glitch.js and run check_glitch_parity.py
+RENDER_VERSION = 3
+
+
+def scale_boxes(boxes, sf_width, sf_height):
+    return [(int(x1*sf_width), int(y1*sf_height), int(x2*sf_width), int(y2*sf_height)) for x1,y1,x2,y2 in boxes]
+
+
+def encode_layout(img_path, real_boxes_orig, fake_boxes_orig, target_width, glitch_seed, out_format=AnimationFormat()):
+    """Render one layout and return (data, scaled_real, scaled_fake), encoded as `out_format`.
+
+    Touches no Streamlit state, so it is safe to call from worker threads and
+    from the offline pool builder.
+    """
+    base, sf_width, sf_height = load_level_base(img_path, target_width)
+
+    # Use the *scaled* boxes to generate the frames, not the original ones.
+    scaled_real = scale_boxes(real_boxes_orig, sf_width, sf_height)
+    scaled_fake = scale_boxes(fake_boxes_orig, sf_width, sf_height)
+
+    # Frames are produced as the encoder asks for them, so only a couple exist at any time
+    def glitches(): return render_glitch_frames(base, scaled_real, scaled_fake, glitch_seed, GLITCH_FRAMES)
+    if out_format.name == "gif":
+        palette, base_p = load_level_palette(img_path, target_width)
+        data = encode_delta_gif(base, base_p, palette, BASE_HOLD_MS, ((f, GLITCH_FRAME_MS) for f in glitches()))
+    else:
+        data = encode_pillow_animation(out_format, base, BASE_HOLD_MS, glitches, GLITCH_FRAMES, GLITCH_FRAME_MS)
+    return data, scaled_real, scaled_fake
+
+
+def render_layout(cache, img_path, real_boxes_orig, fake_boxes_orig, target_width, glitch_seed, out_format=AnimationFormat()):
+    """Return (path, scaled_real, scaled_fake) for a layout, rendering it only on a RenderCache miss."""
+    key = cache_key(RENDER_VERSION, file_digest(img_path), target_width, glitch_seed,
+                    real_boxes_orig, fake_boxes_orig, list(out_format))
+    path = cache.get(key, out_format.name)
+    if path:
+        _, sf_width, sf_height = load_level_base(img_path, target_width)
+        return path, scale_boxes(real_boxes_orig, sf_width, sf_height), scale_boxes(fake_boxes_orig, sf_width, sf_height)
+    data, scaled_real, scaled_fake = encode_layout(img_path, real_boxes_orig, fake_boxes_orig, target_width, glitch_seed, out_format)
+    return cache.put(key, out_format.name, data), scaled_real, scaled_fake
@@ -0,0 +1,158 @@
+import random
+import sqlite3
+import threading
+import time
+
+import streamlit as st
+
+SCOPES = ["https://spreadsheets.google.com/feeds", "https://www.googleapis.com/auth/drive"]
+WORKSHEET = "Scores"
+HEADER = ["Tag", "Name", "USN", "Time"]
+
+
+# --- SHEETS CLIENT ---
+class SheetsWriter:
+    """Authorized gspread client for one spreadsheet, reused for every write.
+
+    The worksheet handle is kept until a write fails, then reopened (and the
+    client re-authorized) on the next attempt.
+    """
+
+    def __init__(self, creds_info):
+        self.creds_info = dict(creds_info)
+        self._worksheet = None
+        self._lock = threading.Lock()
+
+    def _open(self):
+        # Imported on the first upload, so processes that never save a score never load the Google client libraries
+        import gspread
+        from google.oauth2.service_account import Credentials
+        client = gspread.authorize(Credentials.from_service_account_info(self.creds_info, scopes=SCOPES))
+        sh = client.open_by_url(self.creds_info["spreadsheet"])
+        try: return sh.worksheet(WORKSHEET)
+        except gspread.exceptions.WorksheetNotFound:
+            print(f"Worksheet '{WORKSHEET}' not found, creating it.")
+            worksheet = sh.add_worksheet(title=WORKSHEET, rows=100, cols=len(HEADER))
+            worksheet.append_row(HEADER)
+            return worksheet
+
+    def append(self, rows):
+        with self._lock:
+            try:
+                if self._worksheet is None: self._worksheet = self._open()
+                self._worksheet.append_rows(rows)
+            except Exception:
+                self._worksheet = None
+                raise
+
+
+@st.cache_resource(show_spinner=False)
+def get_sheets_writer(creds_info):
+    """Process-wide SheetsWriter for the spreadsheet and service account in `creds_info`."""
+    return SheetsWriter(creds_info)
+
+
+# --- WRITE-BEHIND QUEUE ---
+# Scores are journaled to SQLite before the player is told they are queued,
+# then a background thread appends them to the sheet in batches, retrying with
+# jittered exponential backoff while the sheet is slow or down. Rows are only
+# deleted after a successful append, and scores left over from a previous run
+# are sent on start-up, so nothing is lost. Workers sharing a journal claim
+# rows with a lease; a worker that dies mid-write may cause a duplicate row,
+# never a missing one.
+BATCH_SIZE = 100
+LEASE_SECONDS = 120
+IDLE_POLL_SECONDS = 30  # also picks up rows whose lease expired in another process
+BACKOFF_BASE, BACKOFF_MAX = 2.0, 300.0
+
+SCHEMA = """CREATE TABLE IF NOT EXISTS pending (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    tag TEXT NOT NULL, name TEXT NOT NULL, usn TEXT NOT NULL, time REAL NOT NULL,
+    queued_at REAL NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, lease_until REAL NOT NULL DEFAULT 0)"""
+
+
+class ScoreQueue:
+    def __init__(self, path, write_rows, on_written=None):
+        self.path = path
+        self.write_rows = write_rows  # called with [[tag, name, usn, "12.34"], ...]; raises on failure
+        self.on_written = on_written  # called with the same rows after they reached the sheet
+        self.sent = self.failures = 0
+        self._wake = threading.Event()
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute(SCHEMA)
+        threading.Thread(target=self._run, name="score-writer", daemon=True).start()
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def submit(self, tag, name, usn, time_val):
+        """Journal a score for upload; once this returns, the score survives restarts."""
+        with self._connect() as db:
+            db.execute("INSERT INTO pending (tag, name, usn, time, queued_at) VALUES (?, ?, ?, ?, ?)",
+                       (tag, name, usn, time_val, time.time()))
+        self._wake.set()
+
+    def pending(self):
+        with self._connect() as db: return db.execute("SELECT COUNT(*) FROM pending").fetchone()[0]
+
+    def _claim(self, db):
+        now = time.time()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            rows = db.execute("SELECT id, tag, name, usn, time FROM pending WHERE lease_until < ? ORDER BY id LIMIT ?",
+                              (now, BATCH_SIZE)).fetchall()
+            db.executemany("UPDATE pending SET lease_until = ? WHERE id = ?", [(now + LEASE_SECONDS, r[0]) for r in rows])
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        return rows
+
+    def _run(self):
+        db = self._connect()
+        failures = 0
+        while True:
+            # Errors from the sheet or the journal (e.g. "database is locked") are retried with backoff;
+            # the writer must outlive them, or every later score would sit in the journal until a restart
+            try:
+                if self._send_batch(db): failures = 0
+                else:
+                    self._wake.wait(IDLE_POLL_SECONDS)
+                    self._wake.clear()
+            except Exception as e:
+                failures += 1
+                self.failures += 1
+                delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (failures - 1)) * random.uniform(0.5, 1.0)
+                print(f"Score queue error: {e} (retrying in {delay:.0f}s)")
+                time.sleep(delay)
+
+    def _send_batch(self, db):
+        """Claim, append and delete one batch. False if nothing was due; raises on any failure."""
+        batch = self._claim(db)
+        if not batch: return False
+        ids = [(r[0],) for r in batch]
+        rows = [[tag, name, usn, f"{t:.2f}"] for _, tag, name, usn, t in batch]
+        try: self.write_rows(rows)
+        except Exception:
+            # Release the lease now; if this fails too, it simply runs out
+            db.executemany("UPDATE pending SET lease_until = 0, attempts = attempts + 1 WHERE id = ?", ids)
+            raise
+        self.sent += len(rows)
+        db.executemany("DELETE FROM pending WHERE id = ?", ids)
+        if self.on_written:
+            try: self.on_written(rows)
+            except Exception as e: print(f"Score callback error: {e}")
+        return True
+
+
+# Callbacks are not part of the cache key (leading underscore): one queue per journal
+@st.cache_resource(show_spinner=False)
+def _open_score_queue(path, _write_rows, _on_written):
+    return ScoreQueue(path, _write_rows, _on_written)
+
+def get_score_queue(path, write_rows, on_written=None):
+    """Process-wide ScoreQueue for the journal at `path`; callbacks follow the latest caller."""
+    queue = _open_score_queue(path, write_rows, on_written)
+    queue.write_rows, queue.on_written = write_rows, on_written
+    return queue
@@ -0,0 +1,124 @@
+import sqlite3
+import time
+from abc import ABC, abstractmethod
+
+import pandas as pd
+import streamlit as st
+
+import config
+from leaderboard import PlayerRank, Score, get_leaderboard_cache
+from score_queue import get_score_queue, get_sheets_writer
+
+# --- SCORE STORES ---
+# Where scores live is chosen by config (SCORE_STORE in config.py). Every store
+# answers the same three calls: submit a score, the fastest `n` scores (as
+# leaderboard.Score tuples, fastest first) and a player's rank by USN.
+
+
+class ScoreStore(ABC):
+    @abstractmethod
+    def submit(self, tag, name, usn, time_val):
+        """Record a finished run. Raises if the score could not be accepted."""
+
+    @abstractmethod
+    def top(self, n): ...
+
+    @abstractmethod
+    def rank(self, usn):
+        """PlayerRank of `usn`'s best score, or None if they have no score yet."""
+
+
+class SheetsScoreStore(ScoreStore):
+    """Google Sheets: writes go through the durable write-behind queue, reads
+    through the process-wide leaderboard cache, which holds at most its own size.
+    `connect()` returns the sheet connection; it is only called when the cache reloads."""
+
+    def __init__(self, connect, creds_info, journal, leaderboard):
+        self.connect = connect
+        self.creds_info = creds_info
+        self.journal = journal
+        self.leaderboard = leaderboard
+
+    def _read(self):
+        df = self.connect().read(worksheet="Scores", ttl=0, dtype=str)
+        df.columns = df.columns.str.strip()
+        if not all(c in df.columns for c in ['Tag', 'Name', 'USN', 'Time']): return []
+        df['Time'] = pd.to_numeric(df['Time'].astype(str).str.replace(',', ''), errors='coerce')
+        df.dropna(subset=['Time', 'USN'], inplace=True)
+        return list(zip(df['Name'], df['USN'], df['Time']))
+
+    def _written(self, rows):
+        for tag, name, usn, time_val in rows: self.leaderboard.add(name, usn, float(time_val))
+
+    def queue(self):
+        """The process-wide write-behind queue; its writer starts by sending scores left in the journal."""
+        if "spreadsheet" not in self.creds_info: raise ValueError("'spreadsheet' (URL) not found in secrets.")
+        return get_score_queue(self.journal, get_sheets_writer(self.creds_info).append, self._written)
+
+    def submit(self, tag, name, usn, time_val):
+        self.queue().submit(tag, name, usn, time_val)
+
+    def top(self, n): return self.leaderboard.top(self._read)[:n]
+
+    def rank(self, usn):
+        self.leaderboard.top(self._read)
+        return self.leaderboard.rank(usn)
+
+
+class SQLiteScoreStore(ScoreStore):
+    """Local SQLite file, for offline play and load tests.
+
+    The (time, id) index serves the leaderboard and rank counts straight from
+    the index; the (usn, time) index finds a player's best with one seek.
+    """
+
+    SCHEMA = ("""CREATE TABLE IF NOT EXISTS scores (
+                 id INTEGER PRIMARY KEY AUTOINCREMENT,
+                 tag TEXT NOT NULL, name TEXT NOT NULL, usn TEXT NOT NULL, time REAL NOT NULL, created_at REAL NOT NULL)""",
+              "CREATE INDEX IF NOT EXISTS scores_by_time ON scores (time, id)",
+              "CREATE INDEX IF NOT EXISTS scores_by_usn ON scores (usn, time)")
+
+    def __init__(self, path):
+        self.path = path
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            for statement in self.SCHEMA: db.execute(statement)
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+    def submit(self, tag, name, usn, time_val):
+        with self._connect() as db:
+            db.execute("INSERT INTO scores (tag, name, usn, time, created_at) VALUES (?, ?, ?, ?, ?)",
+                       (tag, name, usn, time_val, time.time()))
+
+    def top(self, n):
+        with self._connect() as db:
+            return [Score(*row) for row in db.execute("SELECT time, id, name, usn FROM scores ORDER BY time, id LIMIT ?", (n,))]
+
+    def rank(self, usn):
+        with self._connect() as db:
+            best = db.execute("SELECT MIN(time) FROM scores WHERE usn = ?", (usn,)).fetchone()[0]
+            if best is None: return None
+            faster = db.execute("SELECT COUNT(*) FROM scores WHERE time < ?", (best,)).fetchone()[0]
+        return PlayerRank(faster + 1, best)
+
+
+@st.cache_resource(show_spinner=False)
+def get_sqlite_store(path):
+    """Process-wide SQLiteScoreStore for the database at `path`."""
+    return SQLiteScoreStore(path)
+
+
+def connect_sheets():
+    # Deferred until the sheet is first read: the connection pulls in gspread and the Google auth libraries
+    from streamlit_gsheets import GSheetsConnection
+    return st.connection("gsheets", type=GSheetsConnection)
+
+def open_score_store():
+    """The ScoreStore selected in config.py, or None if Google Sheets is selected but not configured."""
+    if config.SCORE_STORE == "sqlite": return get_sqlite_store(config.SCORE_DB)
+    try: creds = dict(st.secrets["connections"]["gsheets"])
+    except Exception: return None
+    return SheetsScoreStore(connect_sheets, creds, config.SCORE_JOURNAL,
+                            get_leaderboard_cache("Scores", config.LEADERBOARD_TTL, config.LEADERBOARD_SIZE))
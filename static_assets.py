@@ -0,0 +1,60 @@
+import hashlib
+import os
+import re
+import tempfile
+import threading
+
+import metrics
+from render_cache import file_digest
+
+# --- STATIC ASSETS ---
+# Media is served by Streamlit's static file route (server.enableStaticServing)
+# under content-hashed names, so pages only carry short URLs, browsers fetch
+# each file once, and a changed file always gets a new URL. Because of that,
+# these URLs can be cached forever (see CACHE_CONTROL and asgi.py).
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "static")
+STATIC_URL = "app/static"
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+HASHED_NAME = re.compile(r"\.[0-9a-f]{12}\.\w+$")
+
+_published = {}
+_published_lock = threading.Lock()
+
+
+def _publish(name, read):
+    with _published_lock:
+        metrics.cache_lookup("static_assets", name in _published)
+        if name not in _published:
+            target = os.path.join(STATIC_DIR, name)
+            if not os.path.exists(target):
+                os.makedirs(STATIC_DIR, exist_ok=True)
+                fd, tmp = tempfile.mkstemp(dir=STATIC_DIR, prefix=".tmp-")
+                try:
+                    with os.fdopen(fd, "wb") as out: out.write(read())
+                    os.replace(tmp, target)
+                except BaseException:
+                    os.unlink(tmp)
+                    raise
+            _published[name] = f"{STATIC_URL}/{name}"
+        return _published[name]
+
+
+def publish_asset(path):
+    """URL of a content-hashed copy of `path` under ./static, or None if the file is missing."""
+    try: digest = file_digest(path)
+    except OSError: return None
+    stem, ext = os.path.splitext(os.path.basename(path))
+
+    def read():
+        with open(path, "rb") as src: return src.read()
+    return _publish(f"{stem}.{digest[:12]}{ext}", read)
+
+
+def publish_bytes(stem, ext, data):
+    """URL of generated content published like publish_asset, e.g. a resized image."""
+    return _publish(f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}.{ext}", lambda: data)
+
+
+def is_hashed_asset(url_path):
+    """True for request paths of files published by publish_asset."""
+    return f"/{STATIC_URL}/" in url_path and bool(HASHED_NAME.search(url_path))
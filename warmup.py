@@ -0,0 +1,84 @@
+import threading
+import time
+
+import config
+from encoders import probe_images
+from glitch_board import level_base_url
+from layout import LEVEL_FILES
+from score_store import SheetsScoreStore, open_score_store
+from renderer import load_level_palette
+from static_assets import publish_asset
+
+# --- WARM-UP ---
+# Everything the first players would otherwise pay for is done once per
+# process, on a background thread, as soon as the server starts: the score
+# queue resumes sending anything left in its journal, media is hashed and
+# published, every level is decoded and resized for every render tier, and
+# (server renderer) the output formats are probed. Only caches are filled:
+# layouts are never pre-rendered here, since a small fixed set of warm seeds
+# would hand repeat players the same first board on every level.
+# Its status backs the /ready endpoint in asgi.py.
+
+
+class WarmUp:
+    def __init__(self):
+        self.state = "cold"  # cold -> warming -> ready
+        self.steps, self.errors = {}, {}
+        self.started = self.finished = None
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """Start warming up on a background thread; later calls do nothing."""
+        with self._lock:
+            if self._thread: return
+            self.state, self.started = "warming", time.time()
+            self._thread = threading.Thread(target=self._run, name="warm-up", daemon=True)
+            self._thread.start()
+
+    @property
+    def ready(self): return self.state == "ready"
+
+    def status(self):
+        with self._lock:
+            end = self.finished or time.time()
+            return {"state": self.state, "seconds": round(end - self.started, 3) if self.started else None,
+                    "steps": dict(self.steps), "errors": dict(self.errors)}
+
+    # A failed step is reported but does not stop the others: the app still works, only colder
+    def _run(self):
+        for name, step in self._plan():
+            start = time.perf_counter()
+            try: step()
+            except Exception as e:
+                print(f"Warm-up error in {name}: {e}")
+                with self._lock: self.errors[name] = str(e)
+            with self._lock: self.steps[name] = round(time.perf_counter() - start, 3)
+        with self._lock: self.state, self.finished = "ready", time.time()
+        print(f"Warm-up finished in {self.finished - self.started:.1f}s" + (f", {len(self.errors)} steps failed" if self.errors else ""))
+
+    def _plan(self):
+        if config.SCORE_STORE == "sheets": yield "score queue", self._resume_score_queue
+        media = [config.BACKGROUND_VIDEO, *config.MUSIC_TRACKS.values(), *config.SOUND_EFFECTS.values()]
+        yield "media", lambda: [publish_asset(f) for f in media if not f.startswith(("http://", "https://"))]
+        server = config.BOARD_RENDERER != "client"
+        for level, img_path in enumerate(LEVEL_FILES):
+            yield f"level{level + 1}", lambda img_path=img_path: self._warm_level(img_path, server)
+        if server: yield "format probes", probe_images
+
+    def _resume_score_queue(self):
+        # Scores journaled before a crash or redeploy are sent now, not when the next player uploads
+        store = open_score_store()
+        if isinstance(store, SheetsScoreStore): store.queue()
+
+    def _warm_level(self, img_path, server):
+        for width in config.RENDER_TIERS:
+            if server: load_level_palette(img_path, width)  # the GIF fallback's palette, and the resized base under it
+            else: level_base_url(img_path, width)
+
+
+_warm_up = WarmUp()
+
+def get_warm_up():
+    """The process-wide WarmUp."""
+    return _warm_up